@@ -10,79 +10,350 @@ Dependencies:
     - Environment variables properly configured
 """
 # ====================================================================================================== #
-from fastapi import FastAPI, HTTPException
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Annotated, Any, AsyncIterator, Dict, Type, TypeVar
+import msgspec
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from app.core.settings import settings
-from app.graph.agent_graph import create_agent_graph, AgentState
+from app.core.clients import get_async_openai_client, get_pinecone_executor, get_pinecone_index
+from app.graph.agent_graph import build_initial_state, create_agent_graph, run_agent_batch, stream_agent_response
+
+logger = logging.getLogger("pb_rag.api")
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
 # Request/Response models
+# msgspec Structs decode, validate and encode these hot, tiny payloads much faster than Pydantic
 # ====================================================================================================== #
-class QuestionRequest(BaseModel):
-    question: str
+# Upper bound on questions accepted by /ask_batch in a single request
+MAX_BATCH_QUESTIONS = 20
+
+# Questions need at least 3 characters once surrounding whitespace is stripped; validated while decoding
+Question = Annotated[str, msgspec.Meta(min_length=3)]
+
+
+def _clean_question(question: str) -> str:
+    """
+    Returns: str: Question without surrounding whitespace
+
+    Raises: ValueError: If fewer than 3 characters remain (reported by msgspec as a validation error)
+    """
+    cleaned_question = question.strip()
+    if len(cleaned_question) < 3:
+        raise ValueError("Question must be at least 3 characters long")
+    return cleaned_question
+
+
+class QuestionRequest(msgspec.Struct):
+    question: Question
 
-class RAGResponse(BaseModel):
+    def __post_init__(self):
+        self.question = _clean_question(self.question)
+
+class QuestionBatchRequest(msgspec.Struct):
+    questions: Annotated[list[Question], msgspec.Meta(min_length=1, max_length=MAX_BATCH_QUESTIONS)]
+
+    def __post_init__(self):
+        self.questions = [_clean_question(question) for question in self.questions]
+
+class RAGResponse(msgspec.Struct):
     answer: str
     sources: list[str]
     confidence: float
 
+
+StructT = TypeVar("StructT", bound=msgspec.Struct)
+
+# Reusable encoder and decoders (construction is done once, not per request)
+_json_encoder = msgspec.json.Encoder()
+_question_decoder = msgspec.json.Decoder(QuestionRequest)
+_question_batch_decoder = msgspec.json.Decoder(QuestionBatchRequest)
+
+
+async def _decode_body(raw_request: Request, decoder: "msgspec.json.Decoder[StructT]") -> StructT:
+    """
+    Decode and validate a JSON request body with msgspec.
+    Field constraints (e.g. minimum question length) are enforced here, before the handler body runs.
+
+    Raises: HTTPException: 422 if the body is not valid JSON or does not match the schema
+    """
+    try:
+        return decoder.decode(await raw_request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def _json_response(content: Any) -> Response:
+    """
+    Returns: Response: JSON response encoded with msgspec
+    """
+    return Response(content=_json_encoder.encode(content), media_type="application/json")
+
+
+def _openapi_schema(struct_type: Type[msgspec.Struct]) -> Dict[str, Any]:
+    """
+    Returns: Dict: Inline JSON schema for a msgspec Struct, used to keep /docs accurate
+    """
+    _, components = msgspec.json.schema_components([struct_type])
+    return components[struct_type.__name__]
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Application lifespan - one-shot startup and shutdown
+# ====================================================================================================== #
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan handler.
+    
+    On startup, configures logging and eagerly builds the compiled LangGraph agent and the
+    shared OpenAI/Pinecone clients so the first /ask does not pay their construction cost.
+    Verbose per-request logs are only emitted when LOG_LEVEL is DEBUG.
+    On shutdown, closes the async OpenAI client's connection pool and the Pinecone thread pool.
+    """
+    logging.basicConfig(level=settings.log_level.upper())
+    
+    app.state.agent = create_agent_graph()
+    app.state.openai = get_async_openai_client()
+    try:
+        # Warm the shared index handle; the graph reads it through get_pinecone_index()
+        get_pinecone_index()
+    except Exception as e:
+        # Keep serving (health checks, retries); the index is resolved lazily on first use
+        logger.warning("Pinecone index not ready at startup: %s", e)
+    
+    logger.info("PB RAG API started: env=%s, model=%s", settings.env, settings.openai_model)
+    yield
+    
+    logger.info("PB RAG API shutting down...")
+    await app.state.openai.close()
+    get_async_openai_client.cache_clear()
+    get_pinecone_executor().shutdown(wait=False)
+    get_pinecone_executor.cache_clear()
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
 # Initialize FastAPI application
 app = FastAPI(
     title="PB RAG", 
     version="0.1.0",
-    description="Retrieval-Augmented Generation API for document processing and AI interactions"
+    description="Retrieval-Augmented Generation API for document processing and AI interactions",
+    default_response_class=ORJSONResponse,  # orjson encodes JSON bodies much faster than the stdlib
+    lifespan=lifespan
 )
 
-# Add CORS middleware for public API access
+# Add CORS middleware restricted to the deployed frontends (ALLOWED_ORIGINS)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins for public API
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=settings.allowed_origins_list,
+    allow_credentials=False,
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "authorization", "if-none-match"],
+    expose_headers=["ETag"],
 )
+
+class AdmissionGate:
+    """
+    Admission control: caps the questions in flight so bursts cannot exhaust the client pools.
+    Requests that do not fit are rejected at once (503) instead of queueing. Only touched
+    from the event loop, so a plain counter is enough.
+
+    Attributes:
+        limit: Maximum number of questions in flight
+        in_flight: Questions currently being answered
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self, slots: int = 1) -> bool:
+        """
+        Args: slots: Questions the request carries (one per question of a batch); capped at the
+              limit, so an oversized batch runs alone instead of never being admitted
+
+        Returns: bool: True if every slot was taken, False (nothing taken) if they do not all fit
+        """
+        slots = min(slots, self.limit)
+        if self.in_flight + slots > self.limit:
+            return False
+        self.in_flight += slots
+        return True
+
+    def release(self, slots: int = 1):
+        self.in_flight -= min(slots, self.limit)
+
+
+ask_gate = AdmissionGate(settings.max_concurrent_ask)
+
+
+def _service_busy() -> HTTPException:
+    """
+    Returns: HTTPException: 503 answer for requests rejected by admission control
+    """
+    return HTTPException(status_code=503, detail="Service busy, please retry shortly", headers={"Retry-After": "1"})
+
+# Static part of the /healthz payload; only the timestamp is added per probe
+HEALTH_STATUS_BASE = {
+    "status": "ok",
+    "env": settings.env,
+    "openai_model": settings.openai_model,
+    "pinecone_index": settings.pinecone_index,
+}
+
+# Cache-Control applied to responses that are safe for clients and CDNs to reuse
+CACHE_CONTROL_BY_PATH = {
+    "/healthz": "public, max-age=30",
+}
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# ETag middleware - lets clients revalidate JSON responses with If-None-Match
+# ====================================================================================================== #
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Args:
+        if_none_match: Raw If-None-Match request header (may list several tags)
+        etag: ETag computed for the current response body
+
+    Returns: bool: True if the client already holds this representation
+    """
+    candidate_tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in candidate_tags or etag in candidate_tags
+
+
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    """
+    Add a weak ETag to successful JSON responses and answer 304 Not Modified when the
+    client sends a matching If-None-Match header, so unchanged bodies are not re-sent.
+    """
+    response = await call_next(request)
+
+    is_cacheable = (
+        request.method in ("GET", "POST")
+        and response.status_code == 200
+        and response.headers.get("content-type", "").startswith("application/json")
+    )
+    if not is_cacheable:
+        return response
+
+    # Buffer the body once to hash it; JSON responses here are small
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = 'W/"' + hashlib.blake2b(body).hexdigest()[:16] + '"'
+
+    cache_headers = {"ETag": etag}
+    cache_control = CACHE_CONTROL_BY_PATH.get(request.url.path)
+    if cache_control:
+        cache_headers["Cache-Control"] = cache_control
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    headers = dict(response.headers)
+    headers.update(cache_headers)
+    return Response(
+        content=body,
+        status_code=response.status_code,
+        headers=headers,
+        media_type=response.media_type,
+    )
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
-@app.post("/ask", response_model=RAGResponse)
-async def ask_question(request: QuestionRequest):
+# Server-Sent Events streaming for /ask?stream=true
+# ====================================================================================================== #
+def _format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Returns: str: A single Server-Sent Events frame
+    """
+    return f"event: {event}\ndata: {_json_encoder.encode(data).decode()}\n\n"
+
+
+async def _stream_answer_events(question: str) -> AsyncIterator[str]:
+    """
+    Forward agent streaming events as SSE frames while holding an admission slot.
+
+    The first frame carries sources and confidence, followed by answer tokens and a
+    final "done" frame. Errors after the stream has started are reported in-band.
+    """
+    if not ask_gate.try_acquire():
+        yield _format_sse("error", {"detail": "Service busy, please retry shortly"})
+        return
+    try:
+        async for agent_event in stream_agent_response(question):
+            event_name = agent_event.pop("event")
+            yield _format_sse(event_name, agent_event)
+        yield _format_sse("done", {})
+    except Exception as e:
+        logger.error("Error in streaming ask_question: %s", e)
+        yield _format_sse("error", {"detail": f"Internal server error: {str(e)}"})
+    finally:
+        ask_gate.release()
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+@app.post(
+    "/ask",
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"application/json": {"schema": _openapi_schema(QuestionRequest)}}}
+    },
+    responses={200: {"content": {"application/json": {"schema": _openapi_schema(RAGResponse)}}}}
+)
+async def ask_question(raw_request: Request, stream: bool = False):
     """
     Main RAG endpoint that processes user questions using the LangGraph agent.
     
-    Args: request: QuestionRequest containing the user's question
+    Args:
+        raw_request: HTTP request whose JSON body is a QuestionRequest
+        stream: When true, stream the answer as Server-Sent Events instead of a single JSON body
         
-    Returns: RAGResponse with answer, sources, and confidence
+    Returns: RAGResponse with answer, sources, and confidence (or a text/event-stream)
     """
+    request = await _decode_body(raw_request, _question_decoder)
+    
     try:
-        # Validate question
-        if not request.question or len(request.question.strip()) < 3:
-            raise HTTPException(
-                status_code=400, 
-                detail="Question must be at least 3 characters long"
-            )
+        # Reject immediately instead of queueing when every slot is taken
+        # (the streaming path takes its slot once the response starts)
+        if ask_gate.in_flight >= ask_gate.limit:
+            raise _service_busy()
         
-        # Create agent instance
-        agent = create_agent_graph()
+        # Streaming path: sources/confidence first, then the answer token by token
+        if stream:
+            return StreamingResponse(
+                _stream_answer_events(request.question),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache"}
+            )
         
         # Prepare input for the agent
-        agent_input: AgentState = {
-            "question": request.question.strip(),
-            "validated_question": None,
-            "relevant_chunks": [],
-            "generated_response": None,
-            "confidence": None,
-            "final_response": None,
-            "status": "started"
-        }
+        agent_input = build_initial_state(request.question)
         
-        # Execute the agent workflow
-        result = agent.invoke(agent_input)
+        # Execute the agent workflow while holding an admission slot
+        if not ask_gate.try_acquire():
+            raise _service_busy()
+        try:
+            result = await app.state.agent.ainvoke(agent_input)
+        finally:
+            ask_gate.release()
         
         # Extract the final response
         final_response = result.get("final_response", {})
@@ -94,16 +365,68 @@ async def ask_question(request: QuestionRequest):
             )
         
         # Return formatted response
-        return RAGResponse(
+        return _json_response(RAGResponse(
             answer=final_response.get("answer", ""),
             sources=final_response.get("sources", []),
             confidence=final_response.get("confidence", 0.0)
+        ))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in ask_question: %s", e)
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Internal server error: {str(e)}"
         )
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+@app.post(
+    "/ask_batch",
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"application/json": {"schema": _openapi_schema(QuestionBatchRequest)}}}
+    },
+    responses={200: {"content": {"application/json": {"schema": {"type": "array", "items": _openapi_schema(RAGResponse)}}}}}
+)
+async def ask_questions_batch(raw_request: Request):
+    """
+    Batch RAG endpoint: answers several questions in one call.
+
+    All question embeddings are generated with a single OpenAI request and the
+    Pinecone queries and LLM generations run concurrently.
+    
+    Args: raw_request: HTTP request whose JSON body is a QuestionBatchRequest
+        
+    Returns: List of RAGResponse, in the same order as the questions
+    """
+    request = await _decode_body(raw_request, _question_batch_decoder)
+    
+    try:
+        # One admission slot per question, all or nothing, so batches cannot exceed the cap
+        slots = len(request.questions)
+        if not ask_gate.try_acquire(slots):
+            raise _service_busy()
+        try:
+            final_responses = await run_agent_batch(request.questions)
+        finally:
+            ask_gate.release(slots)
+        
+        return _json_response([
+            RAGResponse(
+                answer=final_response.get("answer", ""),
+                sources=final_response.get("sources", []),
+                confidence=final_response.get("confidence", 0.0)
+            )
+            for final_response in final_responses
+        ])
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in ask_question: {str(e)}")
+        logger.error("Error in ask_questions_batch: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Internal server error: {str(e)}"
@@ -124,19 +447,14 @@ def health_check():
             - env: Current environment (development, production, etc.)
             - openai_model: Configured OpenAI model for embeddings
             - pinecone_index: Configured Pinecone index name
+            - timestamp: Current UTC time in ISO 8601 format
             
     Raises: HTTPException: If health check fails
     """
     try:
-        health_status = {
-            "status": "ok",
-            "env": settings.env,
-            "openai_model": settings.openai_model,
-            "pinecone_index": settings.pinecone_index,
-            "timestamp": "2024-01-01T00:00:00Z"  # Add timestamp for monitoring
-        }
-        
-        return health_status
+        # Only the timestamp changes between probes; the rest is pre-built at import
+        timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+        return {**HEALTH_STATUS_BASE, "timestamp": timestamp}
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -158,34 +476,9 @@ def root():
         "endpoints": {
             "health": "/healthz",
             "ask": "/ask",
+            "ask_batch": "/ask_batch",
             "docs": "/docs"
         },
         "status": "operational"
     }
 # ====================================================================================================== #
-
-
-
-# ====================================================================================================== #
-@app.on_event("startup")
-def startup_event():
-    """
-    Application startup event handler.
-    
-    Performs initialization tasks when the FastAPI application starts.
-    """
-    print(f"[OK] PB RAG API started: env={settings.env}, model={settings.openai_model}")
-# ====================================================================================================== #
-
-
-
-# ====================================================================================================== #
-@app.on_event("shutdown")
-def shutdown_event():
-    """
-    Application shutdown event handler.
-    
-    Performs cleanup tasks when the FastAPI application shuts down.
-    """
-    print("[INFO] PB RAG API shutting down...")
-# ====================================================================================================== #
@@ -0,0 +1,89 @@
+"""
+Shared External Service Clients
+
+This module exposes process-wide singletons for the OpenAI and Pinecone clients.
+Each client owns an HTTPS connection pool, so building them once and reusing them
+avoids a fresh DNS lookup, TLS handshake and pool setup on every request.
+
+Clients are created lazily on first use and cached for the lifetime of the process.
+The underlying SDK clients are thread-safe and manage their own connection pools.
+
+Dependencies:
+    - OpenAI Python SDK
+    - Pinecone Python SDK (gRPC transport)
+    - Application settings configuration
+"""
+
+# ====================================================================================================== #
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from openai import AsyncOpenAI, OpenAI
+from pinecone.grpc import PineconeGRPC
+from app.core.settings import settings
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# OpenAI Client
+# ====================================================================================================== #
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """
+    Returns: OpenAI: Shared OpenAI client configured with the application API key
+    """
+    return OpenAI(api_key=settings.openai_api_key)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Async OpenAI Client
+# ====================================================================================================== #
+@lru_cache(maxsize=1)
+def get_async_openai_client() -> AsyncOpenAI:
+    """
+    Returns: AsyncOpenAI: Shared async OpenAI client for use inside the event loop
+    """
+    return AsyncOpenAI(api_key=settings.openai_api_key)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Pinecone Client
+# ====================================================================================================== #
+@lru_cache(maxsize=1)
+def get_pinecone_client() -> PineconeGRPC:
+    """
+    Returns: PineconeGRPC: Shared Pinecone client; data-plane calls go over gRPC (HTTP/2 multiplexed)
+    """
+    return PineconeGRPC(api_key=settings.pinecone_api_key)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Pinecone Index
+# ====================================================================================================== #
+@lru_cache(maxsize=1)
+def get_pinecone_index():
+    """
+    Returns: GRPCIndex: Shared handle to the configured Pinecone index
+    """
+    return get_pinecone_client().Index(settings.pinecone_index)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Pinecone Query Executor
+# ====================================================================================================== #
+@lru_cache(maxsize=1)
+def get_pinecone_executor() -> ThreadPoolExecutor:
+    """
+    Returns: ThreadPoolExecutor: Dedicated pool for the blocking Pinecone SDK calls, so concurrent
+    queries share the gRPC channel without queueing behind other asyncio.to_thread work
+    """
+    return ThreadPoolExecutor(max_workers=settings.pinecone_query_workers, thread_name_prefix="pinecone")
+# ====================================================================================================== #
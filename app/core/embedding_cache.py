@@ -0,0 +1,129 @@
+"""
+Persistent Embedding Cache
+
+This module provides a content-addressed, on-disk cache for OpenAI embeddings backed by SQLite.
+Entries are keyed by SHA256(model + text), so unchanged chunk texts are never sent to the
+embeddings API twice, across ingestion runs. It is used by the ingest pipeline only: the table
+has no eviction, so the API keeps question embeddings in a bounded in-process LRU instead.
+
+The module handles:
+    - Key derivation from (model, text)
+    - Vector storage as raw float32 bytes
+    - Single and bulk lookups/inserts
+    - Thread-safe access to a single shared connection
+
+Usage:
+    - Lookup: get(model, text) / get_many(model, texts)
+    - Insert: put(model, text, vector) / put_many(model, texts, vectors)
+"""
+
+# ====================================================================================================== #
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence
+import numpy as np
+from app.core.settings import settings
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Connection management
+# ====================================================================================================== #
+_connection: Optional[sqlite3.Connection] = None
+_connection_lock = threading.Lock()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """
+    Returns: sqlite3.Connection: Shared connection to the cache database, created on first use
+    """
+    global _connection
+    if _connection is None:
+        cache_path = Path(settings.embedding_cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection shared across threads; every access is serialized by _connection_lock
+        _connection = sqlite3.connect(cache_path, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute("CREATE TABLE IF NOT EXISTS embeddings (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+    return _connection
+
+
+def _cache_key(model: str, text: str) -> bytes:
+    """
+    Returns: bytes: SHA256 digest identifying the (model, text) pair
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).digest()
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Lookups
+# ====================================================================================================== #
+def get_many(model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """
+    Args:
+        model: Embedding model name
+        texts: Texts to look up
+
+    Returns: List with the cached vector for each text, or None where it is not cached
+    """
+    if not texts:
+        return []
+
+    keys = [_cache_key(model, text) for text in texts]
+    with _connection_lock:
+        connection = _get_connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            key_slice = keys[start:start + 500]
+            placeholders = ",".join("?" * len(key_slice))
+            rows = connection.execute(f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", key_slice)
+            found.update(rows.fetchall())
+
+    return [
+        np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None
+        for key in keys
+    ]
+
+
+def get(model: str, text: str) -> Optional[List[float]]:
+    """
+    Returns: Cached embedding vector for (model, text), or None on a miss
+    """
+    return get_many(model, [text])[0]
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Inserts
+# ====================================================================================================== #
+def put_many(model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+    """
+    Args:
+        model: Embedding model name
+        texts: Embedded texts
+        vectors: Embedding vector of each text, in the same order
+    """
+    rows = [
+        (_cache_key(model, text), np.asarray(vector, dtype=np.float32).tobytes())
+        for text, vector in zip(texts, vectors)
+    ]
+    with _connection_lock:
+        connection = _get_connection()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)", rows)
+
+
+def put(model: str, text: str, vector: Sequence[float]):
+    """
+    Store the embedding vector for (model, text).
+    """
+    put_many(model, [text], [vector])
+# ====================================================================================================== #
@@ -0,0 +1,112 @@
+"""
+Semantic Answer Cache
+
+This module keeps recently generated answers in memory, indexed by the embedding of the
+question that produced them. A new question whose embedding is close enough (cosine
+similarity above a threshold) to a cached one is answered from memory, skipping
+retrieval and LLM generation entirely.
+
+The module handles:
+    - Capped LRU storage of (question vector, final response) entries with a TTL
+    - Vectorized similarity lookup against all cached questions at once
+
+The cache is per process. LangGraph runs sync nodes on worker threads, so every public method
+holds a lock: a lookup never sees the stacked vectors of a half-applied store or eviction.
+Entries expire with the TTL; after a re-index, restart the API to start with an empty cache.
+"""
+
+# ====================================================================================================== #
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Semantic cache
+# ====================================================================================================== #
+class SemanticCache:
+    """
+    In-memory LRU of final responses keyed by question embedding.
+
+    Attributes:
+        maxsize: Maximum number of cached answers before the least recently used is evicted
+        ttl: Seconds an answer stays valid
+        threshold: Minimum cosine similarity for two questions to be considered the same
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, threshold: float = 0.98):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Dict[str, Any], float]]" = OrderedDict()
+        # Stacked question vectors, rebuilt lazily after the entries change
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def lookup(self, question_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Args: question_embedding: Embedding vector of the incoming question
+
+        Returns: Cached final response of the most similar question, or None if none is similar enough
+        """
+        query = _normalize(question_embedding)
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            if not self._entries:
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key][0] for key in self._keys])
+
+            similarities = self._matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            key = self._keys[best]
+            self._entries.move_to_end(key)
+            return dict(self._entries[key][1])
+
+    def store(self, question: str, question_embedding: List[float], response: Dict[str, Any]):
+        """
+        Args:
+            question: Validated question, used as the entry key
+            question_embedding: Embedding vector of the question
+            response: Final response produced for the question
+        """
+        entry = (_normalize(question_embedding), dict(response), time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[question] = entry
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys = []
+            self._matrix = None
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    """
+    Returns: np.ndarray: float32 unit vector, so a dot product is the cosine similarity
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+# ====================================================================================================== #
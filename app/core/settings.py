@@ -11,6 +11,8 @@ Dependencies:
     - Pathlib for file path handling
 """
 
+import os
+from functools import lru_cache
 from pathlib import Path
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -21,8 +23,10 @@ from dotenv import load_dotenv
 REPOSITORY_ROOT = Path(__file__).resolve().parents[2]
 ENVIRONMENT_FILE_PATH = REPOSITORY_ROOT / ".env"
 
-# Load environment variables from .env file explicitly (useful for development)
-load_dotenv(ENVIRONMENT_FILE_PATH)
+# Load environment variables from .env file explicitly (useful for development).
+# Skipped when the environment is already populated (containers, CI, warm restarts).
+if not os.environ.get("OPENAI_API_KEY"):
+    load_dotenv(ENVIRONMENT_FILE_PATH)
 # ====================================================================================================== #
 
 
@@ -39,11 +43,20 @@ class Settings(BaseSettings):
         openai_api_key: OpenAI API key for authentication
         openai_model: OpenAI model for text generation
         openai_embedding_model: OpenAI model for text embeddings
+        chunk_size: Maximum chunk length in embedding-model tokens during ingestion (default: 200)
+        chunk_overlap: Overlap between consecutive chunks in tokens (default: 40)
+        embedding_batch_size: Maximum chunks per embeddings request during ingestion (default: 128)
+        embedding_cache_path: SQLite file backing the persistent ingest embedding cache (default: data/embedding_cache.sqlite3)
         pinecone_api_key: Pinecone API key for vector database
         pinecone_index: Pinecone index name for vector storage
         pinecone_cloud: Cloud provider for Pinecone (default: aws)
         pinecone_region: Region for Pinecone service (default: us-east-1)
+        pinecone_query_workers: Threads dedicated to blocking Pinecone query/rerank calls (default: 32)
+        semantic_cache_threshold: Cosine similarity above which a cached answer is reused (default: 0.98)
         env: Application environment (default: dev)
+        log_level: Logging level for the API, agent and ingest scripts (default: INFO; DEBUG adds per-request and per-batch details)
+        max_concurrent_ask: Maximum questions in flight across /ask and /ask_batch before returning 503 (default: 32)
+        allowed_origins: Comma-separated list of frontend origins allowed by CORS (default: none)
     """
     
     # Pydantic-settings configuration for environment file handling
@@ -71,6 +84,30 @@ class Settings(BaseSettings):
         description="OpenAI model for generating text embeddings"
     )
     
+    chunk_size: int = Field(
+        default=200,
+        validation_alias="CHUNK_SIZE",
+        description="Maximum chunk length in embedding-model tokens; changing it requires re-indexing"
+    )
+    
+    chunk_overlap: int = Field(
+        default=40,
+        validation_alias="CHUNK_OVERLAP",
+        description="Token overlap between consecutive chunks of the same document"
+    )
+    
+    embedding_batch_size: int = Field(
+        default=128,
+        validation_alias="EMBEDDING_BATCH_SIZE",
+        description="Maximum number of chunks sent in a single embeddings request during ingestion"
+    )
+    
+    embedding_cache_path: str = Field(
+        default=str(REPOSITORY_ROOT / "data" / "embedding_cache.sqlite3"),
+        validation_alias="EMBEDDING_CACHE_PATH",
+        description="SQLite file storing ingest chunk embeddings keyed by SHA256(model + text) across runs"
+    )
+    
 
     # Pinecone Vector Database Configuration
     pinecone_api_key: str = Field(
@@ -95,6 +132,18 @@ class Settings(BaseSettings):
         validation_alias="PINECONE_REGION",
         description="Geographic region for Pinecone service"
     )
+    
+    pinecone_query_workers: int = Field(
+        default=32,
+        validation_alias="PINECONE_QUERY_WORKERS",
+        description="Size of the thread pool running blocking Pinecone query and rerank calls"
+    )
+    
+    semantic_cache_threshold: float = Field(
+        default=0.98,
+        validation_alias="SEMANTIC_CACHE_THRESHOLD",
+        description="Minimum cosine similarity between two questions to answer from the semantic cache"
+    )
    
 
     # Application Configuration
@@ -103,16 +152,53 @@ class Settings(BaseSettings):
         validation_alias="ENV",
         description="Application environment (dev, staging, production)"
     )
+    
+    log_level: str = Field(
+        default="INFO",
+        validation_alias="LOG_LEVEL",
+        description="Logging level name (DEBUG, INFO, WARNING, ERROR); DEBUG work is skipped above DEBUG"
+    )
+    
+    max_concurrent_ask: int = Field(
+        default=32,
+        validation_alias="MAX_CONCURRENT_ASK",
+        description="Maximum number of questions in flight (each /ask_batch question counts) before the API answers 503"
+    )
+    
+    allowed_origins: str = Field(
+        default="",
+        validation_alias="ALLOWED_ORIGINS",
+        description="Comma-separated list of origins allowed to call the API from a browser"
+    )
+    
+    @property
+    def allowed_origins_list(self) -> list[str]:
+        """
+        Returns: list[str]: CORS origins parsed from the comma-separated ALLOWED_ORIGINS value
+        """
+        return [origin.strip() for origin in self.allowed_origins.split(",") if origin.strip()]
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
 # Global settings instance
-settings = Settings()
-print(f"[OK] Settings loaded: env")
-print(f"[OK] OpenAI API Key")
-print(f"[OK] OpenAI Embedding Model")
-print(f"[OK] Pinecone Index")
-print(f"[OK] Pinecone API Key")
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Returns: Settings: Process-wide settings instance, parsed from the environment only once
+    """
+    return Settings()
+
+
+settings = get_settings()
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+if __name__ == "__main__":
+    print(f"[OK] Settings loaded: env={settings.env}")
+    print(f"[OK] OpenAI Embedding Model: {settings.openai_embedding_model}")
+    print(f"[OK] Pinecone Index: {settings.pinecone_index}")
 # ====================================================================================================== #
@@ -2,19 +2,30 @@
 LangGraph Agent for RAG System
 
 This module implements a simple RAG agent using LangGraph with 4 nodes:
-1. Input Node - Receives and validates user questions
+1. Prepare Node - Cleans the question, embeds it and answers near-duplicates from the semantic cache
 2. Retrieval Node - Searches relevant information in Pinecone
 3. Generation Node - Generates responses using LLM
 4. Output Node - Formats final response
+
+Every node returns only the state keys it updates; LangGraph merges these partial
+updates into the state, so no node copies the whole state dict.
 """
 
-from typing import Dict, Any, List, Optional, TypedDict
+import asyncio
+import hashlib
+import logging
+from functools import lru_cache, partial
+from operator import attrgetter
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, TypedDict
+import numpy as np
+from cachetools import LRUCache, TTLCache
 from langgraph.graph import StateGraph, END
 from langchain_openai import ChatOpenAI
+from app.core.semantic_cache import SemanticCache
 from app.core.settings import settings
-from openai import OpenAI
-from pinecone import Pinecone
-from typing import List
+from app.core.clients import get_async_openai_client, get_pinecone_client, get_pinecone_executor, get_pinecone_index
+
+logger = logging.getLogger("pb_rag.agent")
 
 # ====================================================================================================== #
 # STATE DEFINITION - Using TypedDict for type safety
@@ -22,6 +33,7 @@ from typing import List
 class AgentState(TypedDict):
     question: str
     validated_question: Optional[str]
+    question_embedding: Optional[List[float]]
     relevant_chunks: List[Dict[str, Any]]
     generated_response: Optional[str]
     confidence: Optional[float]
@@ -31,9 +43,70 @@ class AgentState(TypedDict):
 
 
 
+# ====================================================================================================== #
+# Initial state for a new question
+# ====================================================================================================== #
+def build_initial_state(question: str) -> AgentState:
+    """
+    Returns: AgentState: Fresh agent state for a single question
+    """
+    return {
+        "question": question,
+        "validated_question": None,
+        "question_embedding": None,
+        "relevant_chunks": [],
+        "generated_response": None,
+        "confidence": None,
+        "final_response": None,
+        "status": "started"
+    }
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# PROMPTS - Static system prompt, built once at import
+# ====================================================================================================== #
+# The system message must stay byte-identical across requests: it is the shared prefix
+# that OpenAI's automatic prompt caching can reuse. Never interpolate into it.
+_SYSTEM_PROMPT = """Eres un asistente experto en Punta Blanca Solutions.
+Tu tarea es responder preguntas basándote en la información proporcionada.
+
+INSTRUCCIONES CRÍTICAS:
+1. Responde SOLO basándote en la información proporcionada
+2. Si la información es insuficiente, di claramente "No tengo información suficiente sobre [aspecto específico]
+3. Si hay información en múltiples fuentes, combínala para dar una respuesta completa
+4. Cita las fuentes más relevantes (con mayor score)
+5. Responde en español profesional
+6. Sé preciso y específico
+
+Contexto disponible:"""
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+
+# Per-question part of the user prompt; the retrieved context is appended after it
+_USER_PROMPT_PREFIX_TEMPLATE = """
+        Pregunta del usuario: {question}
+
+        Información relevante (ordenada por relevancia):
+        """
+
+# Low temperature for consistent, factual responses
+GENERATION_TEMPERATURE = 0.3
+GENERATION_MAX_TOKENS = 500
+# ====================================================================================================== #
+
+
+
 # ====================================================================================================== #
 # Confidence calibration
 # ====================================================================================================== #
+# Top-1/Top-2/Top-3 weights of the confidence average
+_CONFIDENCE_WEIGHTS = np.array([0.6, 0.3, 0.1], dtype=np.float64)
+
+# Decimal places of the confidence returned to clients
+CONFIDENCE_DECIMALS = 4
+
+
 def compute_confidence_from_scores(
     similarity_scores: List[float],
     expected_min_similarity: float = 0.20,
@@ -50,51 +123,249 @@ def compute_confidence_from_scores(
         expected_min_similarity -> 0.0  (low confidence)
         expected_max_similarity -> 1.0  (high confidence)
     """
-    if not similarity_scores:
-        return 0.0
-
     # Filter out very low scores
-    filtered_scores = [s for s in similarity_scores if s >= score_threshold]
-    if not filtered_scores:
+    scores = np.asarray(similarity_scores, dtype=np.float64)
+    scores = scores[scores >= score_threshold]
+    if not scores.size:
         return 0.0
     
-    # Use top-3 or less if there are few results
-    top_scores = sorted(filtered_scores, reverse=True)[:3]
+    # Use top-3 or less if there are few results, strongest first
+    k = min(3, scores.size)
+    top_scores = np.sort(np.partition(scores, scores.size - k)[-k:])[::-1]
     
     # Weights that sum 1.0
-    weights = [0.6, 0.3, 0.1][:len(top_scores)]
-    weighted_avg = sum(w * s for w, s in zip(weights, top_scores)) / sum(weights)
+    weights = _CONFIDENCE_WEIGHTS[:k]
+    weighted_avg = float(top_scores @ weights) / float(weights.sum())
     
     # More robust normalization
     confidence = (weighted_avg - expected_min_similarity) / (expected_max_similarity - expected_min_similarity)
-    return max(0.0, min(1.0, confidence))
+    
+    # Float64 end to end, rounded so the API never shows representation noise (0.5000000000000001)
+    return round(float(np.clip(confidence, 0.0, 1.0)), CONFIDENCE_DECIMALS)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Retrieval cache - normalized question -> (embedding, reranked chunks)
+# ====================================================================================================== #
+_retrieval_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_retrieval_cache_lock = asyncio.Lock()
+
+
+def _retrieval_cache_key(question: str) -> str:
+    """
+    Build the cache key for a question (stripped and lower-cased, then hashed).
+
+    Entries are not tied to an index version: they expire with the TTL, and restarting
+    the API after a re-index starts with an empty cache.
+    """
+    normalized_question = question.strip().lower()
+    return hashlib.blake2b(normalized_question.encode("utf-8")).hexdigest()
+
+
+# Semantic cache - question embedding -> final response, for paraphrases of answered questions
+_semantic_cache = SemanticCache(maxsize=1024, ttl=3600, threshold=settings.semantic_cache_threshold)
+
+
+def _store_semantic_answer(state: Dict[str, Any], final_response: Dict[str, Any]):
+    """
+    Remember a final response for paraphrases of the question. Only answers grounded in
+    retrieved chunks are worth reusing, so fallbacks and no-context answers are skipped.
+    Shared by the graph, the batch path and the streaming path.
+    """
+    question_embedding = state.get("question_embedding")
+    if question_embedding is not None and state.get("relevant_chunks"):
+        _semantic_cache.store(state.get("validated_question", ""), question_embedding, final_response)
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
-# NODE 1: INPUT NODE - Receives and validates user questions
+# RETRIEVAL HELPERS - Shared by the retrieval node and the batch path
 # ====================================================================================================== #
-def input_node(state: AgentState) -> AgentState:
+# Candidates kept per question; only these are ever reranked and passed to the LLM
+RETRIEVAL_TOP_K = 5
+
+# Pinecone-hosted cross-encoder used to rerank retrieved candidates
+RERANK_MODEL = "bge-reranker-v2-m3"
+
+# Skip the reranker when Top-1 beats Top-3 by this cosine margin (the order is already clear)
+RERANK_SKIP_MARGIN = 0.10
+
+
+# Question embeddings by (model, question): a bounded in-process LRU. User questions are not
+# written to the persistent SQLite cache, which is for ingestion only and has no eviction
+_question_embedding_cache: LRUCache = LRUCache(maxsize=4096)
+
+
+async def embed_questions(questions: List[str]) -> List[List[float]]:
+    """
+    Embed one or more questions with a single OpenAI request (the API accepts a list input).
+    Questions already in the in-process question embedding cache are not sent to the API.
+
+    Args: questions: Validated questions to embed
+
+    Returns: List of embedding vectors, in the same order as the input questions
+    """
+    model = settings.openai_embedding_model
+    embeddings = [_question_embedding_cache.get((model, question)) for question in questions]
+    missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        logger.debug("Question embedding(s) served from the embedding cache")
+        return embeddings
+    
+    missing_questions = [questions[position] for position in missing]
+    logger.debug("Generating %d question embedding(s) with model '%s'", len(missing_questions), model)
+    openai_client = get_async_openai_client()
+    
+    embedding_response = await openai_client.embeddings.create(
+        model=model,
+        input=missing_questions
+    )
     
-    # Extract question from state
-    question = state.get("question", "")
+    # Responses carry their input position; order by it to be safe
+    new_embeddings = [item.embedding for item in sorted(embedding_response.data, key=lambda item: item.index)]
     
-    # Simple validation
-    if not question or len(question.strip()) < 3:
-        raise ValueError("Question must be at least 3 characters long")
+    for position, question, embedding in zip(missing, missing_questions, new_embeddings):
+        _question_embedding_cache[(model, question)] = embedding
+        embeddings[position] = embedding
+    return embeddings
+
+
+async def _run_pinecone_call(function, /, *args, **kwargs):
+    """
+    Run a blocking Pinecone SDK call on the dedicated Pinecone thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pinecone_executor(), partial(function, *args, **kwargs))
+
+
+async def query_index(question: str, question_embedding: List[float]) -> List[Dict[str, Any]]:
+    """
+    Search Pinecone for a question embedding and, when the vector ranking is ambiguous,
+    rerank the candidates against the question text.
+
+    Args:
+        question: Validated question, used by the reranker
+        question_embedding: Embedding vector of the question
+
+    Returns: List of relevant chunks, most relevant first (reranked order when the reranker ran);
+    each chunk's score is its cosine similarity
+    """
+    logger.debug("Searching in Pinecone")
+    index = get_pinecone_index()
     
-    # Clean and store question
-    cleaned_question = question.strip()
+    # The Pinecone client is synchronous, so run its calls on the Pinecone thread pool
+    search_results = await _run_pinecone_call(
+        index.query,
+        vector=question_embedding,
+        top_k=RETRIEVAL_TOP_K,
+        include_metadata=True,
+        include_values=False
+    )
+    matches = search_results.matches
+    if not matches:
+        logger.info("Retrieval found 0 relevant chunks")
+        return []
     
-    print(f"✅ Input Node: Question validated: '{cleaned_question}'")
+    # Pinecone returns matches by cosine similarity; the reranker, when it runs, only reorders them
+    order = range(len(matches))
     
-    # Return updated state
-    return {
-        **state,
-        "validated_question": cleaned_question,
-        "status": "input_validated"
-    }
+    # A single match has nothing to reorder, and a clear Top-1 lead means the reranker would not
+    # change the evidence used for the answer
+    if len(matches) < 2:
+        logger.debug("Skipping rerank (%d match)", len(matches))
+    elif len(matches) >= 3 and matches[0].score - matches[2].score > RERANK_SKIP_MARGIN:
+        logger.debug("Skipping rerank (Top-1 leads Top-3 by %.3f)", matches[0].score - matches[2].score)
+    else:
+        try:
+            rerank_results = await _run_pinecone_call(
+                get_pinecone_client().inference.rerank,
+                model=RERANK_MODEL,
+                query=question,
+                documents=[{"text": match.metadata.get("text", "")} for match in matches],
+                rank_fields=["text"],
+                return_documents=False
+            )
+            order = [reranked.index for reranked in sorted(rerank_results.data, key=attrgetter("score"), reverse=True)]
+        except Exception as e:
+            # The reranker only refines the order; the vector ranking is still a valid answer
+            logger.warning("Rerank failed, keeping vector order: %s", e)
+    
+    # Scores stay cosine similarities in both branches, so confidence is computed on one scale;
+    # the list order is the ordering contract every consumer downstream relies on
+    relevant_chunks = [
+        {
+            "text": matches[position].metadata.get("text", ""),
+            "source": matches[position].metadata.get("sources", "unknown"),
+            "section": matches[position].metadata.get("section", "unknown"),
+            "score": matches[position].score,
+            "chunk_id": matches[position].id
+        }
+        for position in order
+    ]
+    
+    logger.info("Retrieval found %d relevant chunks", len(relevant_chunks))
+    
+    # Log top results for debugging (skipped entirely unless DEBUG is enabled)
+    if relevant_chunks and logger.isEnabledFor(logging.DEBUG):
+        for i, chunk in enumerate(relevant_chunks[:5]):  # Show top 5
+            logger.debug("  %d. Score: %.3f | Section: %s | Text: %s...", i + 1, chunk["score"], chunk["section"], chunk["text"][:80])
+    
+    return relevant_chunks
+
+
+async def _get_cached_retrieval(question: str) -> Optional[Tuple[List[float], List[Dict[str, Any]]]]:
+    """
+    Returns: Cached (embedding, chunks) for the question, or None on a miss
+    """
+    async with _retrieval_cache_lock:
+        return _retrieval_cache.get(_retrieval_cache_key(question))
+
+
+async def _store_cached_retrieval(question: str, question_embedding: List[float], relevant_chunks: List[Dict[str, Any]]):
+    """
+    Remember the embedding and chunks for identical follow-up questions.
+    """
+    async with _retrieval_cache_lock:
+        _retrieval_cache[_retrieval_cache_key(question)] = (question_embedding, relevant_chunks)
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# NODE 1: PREPARE NODE - Cleans and embeds the question, then probes the semantic cache
+# ====================================================================================================== #
+async def prepare_node(state: AgentState) -> Dict[str, Any]:
+    
+    # Clean the question (length is validated at the API boundary)
+    question = state.get("question", "").strip()
+    logger.debug("Prepare Node: question validated: '%s'", question)
+    
+    update: Dict[str, Any] = {"validated_question": question, "status": "input_validated"}
+    
+    try:
+        update["question_embedding"] = (await embed_questions([question]))[0]
+    except Exception as e:
+        # Not fatal: retrieval embeds the question again and reports the error if it persists
+        logger.error("Error embedding question for the semantic cache: %s", e)
+        return update
+    
+    cached_response = _semantic_cache.lookup(update["question_embedding"])
+    if cached_response is not None:
+        logger.info("Semantic cache hit for: '%s'", question)
+        update["final_response"] = cached_response
+        update["status"] = "completed"
+    
+    return update
+
+
+def route_after_prepare(state: AgentState) -> str:
+    """
+    Returns: END when the semantic cache already produced the final response, else the retrieval node
+    """
+    return END if state.get("final_response") is not None else "retrieval"
 # ====================================================================================================== #
 
 
@@ -102,80 +373,43 @@ def input_node(state: AgentState) -> AgentState:
 # ====================================================================================================== #
 # NODE 2: RETRIEVAL NODE - Searches relevant information in Pinecone
 # ====================================================================================================== #
-def retrieval_node(state: AgentState) -> AgentState:
+async def retrieval_node(state: AgentState) -> Dict[str, Any]:
     
     question = state.get("validated_question", "")
     
-    print(f"🔍 Retrieval Node: Searching for: '{question}'")
+    logger.debug("Retrieval Node: searching for: '%s'", question)
+    
+    # Serve repeated questions from memory, skipping both OpenAI and Pinecone
+    cached_retrieval = await _get_cached_retrieval(question)
+    
+    if cached_retrieval is not None:
+        _, relevant_chunks = cached_retrieval
+        logger.info("Retrieval cache hit: %d chunks", len(relevant_chunks))
+        return {
+            "relevant_chunks": relevant_chunks,
+            "status": "retrieval_completed"
+        }
     
     try:
-        # Step 1: Generate embedding for the question
-        print("   📡 Generating embedding for question...")
-        print(f"   🔧 Debug - Using embedding model: '{settings.openai_embedding_model}'")
-        print(f"   🔧 Debug - OpenAI API key: {settings.openai_api_key[:20]}...")
-        openai_client = OpenAI(api_key=settings.openai_api_key)
-        
-        embedding_response = openai_client.embeddings.create(
-            model=settings.openai_embedding_model,
-            input=question
-        )
-        
-        question_embedding = embedding_response.data[0].embedding
-        print(f"   ✅ Embedding generated (dimension: {len(question_embedding)})")
+        # Step 1: Generate embedding for the question (unless the semantic cache node already did)
+        question_embedding = state.get("question_embedding") or (await embed_questions([question]))[0]
+        logger.debug("Embedding generated (dimension: %d)", len(question_embedding))
         
-        # Step 2: Search in Pinecone with rerank
-        print("   🔍 Searching in Pinecone with rerank...")
-        pinecone_client = Pinecone(api_key=settings.pinecone_api_key)
-        index = pinecone_client.Index(settings.pinecone_index)
+        # Step 2: Search in Pinecone and rerank
+        relevant_chunks = await query_index(question, question_embedding)
         
-        # Step 2a: Initial search to get more candidates with a reranker
-        search_results = index.query(
-            vector=question_embedding,
-            top_k=10,  
-            include_metadata=True,
-            include_values=False,
-            rerank={
-                "model": "bge-reranker-v2-m3",
-                "top_n": 10,
-                "rank_fields": ["text"]
-            }
-        )
-        
-        # Step 2: Process reranked results (more relevant)
-        relevant_chunks = []
-        for match in search_results.matches:
-            chunk_data = {
-                "text": match.metadata.get("text", ""),
-                "source": match.metadata.get("sources", "unknown"),
-                "section": match.metadata.get("section", "unknown"),
-                "score": match.score,  # This score is already reranked
-                "chunk_id": match.id
-            }
-            relevant_chunks.append(chunk_data)
-        
-        print(f"   ✅ Found {len(relevant_chunks)} relevant chunks")
-        
-        # Log all results for debugging
-        if relevant_chunks:
-            print(f"   📊 All retrieved chunks:")
-            for i, chunk in enumerate(relevant_chunks[:5]):  # Show top 5
-                print(f"      {i+1}. Score: {chunk['score']:.3f} | Section: {chunk['section']} | Text: {chunk['text'][:80]}...")
-            
-            top_chunk = relevant_chunks[0]
-            print(f"   🏆 Top result: {top_chunk['text'][:100]}... (score: {top_chunk['score']:.3f})")
+        await _store_cached_retrieval(question, question_embedding, relevant_chunks)
         
         # Return updated state
         return {
-            **state,
             "relevant_chunks": relevant_chunks,
             "status": "retrieval_completed"
         }
         
     except Exception as e:
-        print(f"   ❌ Error in retrieval: {str(e)}")
+        logger.error("Error in retrieval: %s", e)
         # Return empty chunks on error, but continue the pipeline
         return {
-            **state,
             "relevant_chunks": [],
             "status": "retrieval_failed",
             "error": str(e)
@@ -184,104 +418,124 @@ def retrieval_node(state: AgentState) -> AgentState:
 
 
 
+# ====================================================================================================== #
+# GENERATION HELPERS - Shared by the generation node and the streaming path
+# ====================================================================================================== #
+def _no_context_response(question: str) -> str:
+    """
+    Returns: str: Generic answer used when retrieval found nothing for the question
+    """
+    return f"No encontré información específica sobre '{question}' en mi base de conocimiento."
+
+
+def _unique_sources(chunks: List[Dict[str, Any]]) -> List[str]:
+    """
+    Returns: List[str]: Chunk sources without duplicates, in relevance order (deterministic output)
+    """
+    return list(dict.fromkeys(chunk.get("source", "unknown") for chunk in chunks))
+
+
+def _build_generation_request(
+    question: str,
+    chunks: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, str]], float]:
+    """
+    Build the chat messages for the LLM and the calibrated confidence for a set of chunks.
+
+    Args:
+        question: Validated user question
+        chunks: Retrieved chunks, already ordered by relevance
+
+    Returns: Tuple of (chat messages, calibrated confidence)
+    """
+    # ---------------------- Extract scores and texts once ------------------
+    # query_index returns chunks most relevant first, scored by cosine similarity (the scale
+    # the confidence anchors are tuned for); the confidence helper picks its own Top-3
+    similarity_scores: list[float] = [float(chunk.get("score", 0.0)) for chunk in chunks]
+    chunk_texts: list[str] = [chunk.get("text", "") for chunk in chunks]
+
+    # ---------------------- Calibrated confidence -------------------------
+    calibrated_confidence: float = compute_confidence_from_scores(
+        similarity_scores=similarity_scores,
+        expected_min_similarity=0.20,  # tweak after measuring on your eval set
+        expected_max_similarity=0.70
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Scores (Top-10): %s", [round(s, 3) for s in similarity_scores[:10]])
+    logger.debug("Calibrated confidence: %.3f", calibrated_confidence)
+    
+    # ---------------------- Create intelligent prompt ----------------------
+    # Human-readable context for the LLM, joined straight from a generator (no intermediate list)
+    context = "\n\n".join(
+        f"Source {idx} (relevance: {chunk_score:.3f}):\n{chunk_text}"
+        for idx, (chunk_score, chunk_text) in enumerate(zip(similarity_scores, chunk_texts), start=1)
+    )
+    user_prompt = f"""{_USER_PROMPT_PREFIX_TEMPLATE.format(question=question)}{context}
+        """
+    
+    messages = [
+        _SYSTEM_MESSAGE,
+        {"role": "user", "content": user_prompt}
+    ]
+    return messages, calibrated_confidence
+# ====================================================================================================== #
+
+
+
 # ====================================================================================================== #
 # NODE 3: GENERATION NODE - Generates responses using LLM
 # ====================================================================================================== #
-def generation_node(state: AgentState) -> AgentState:
+async def generation_node(state: AgentState) -> Dict[str, Any]:
 
     question = state.get("validated_question", "")
     chunks = state.get("relevant_chunks", [])
     
+    # Nothing retrieved: answer generically before any prompt building or OpenAI work
+    if not chunks:
+        logger.warning("No relevant chunks found, returning generic response")
+        return {
+            "generated_response": _no_context_response(question),
+            "status": "generation_completed",
+            "confidence": 0.0
+        }
+    
     try:
-        # Check if we have chunks to work with
-        if not chunks:
-            print("   ⚠️ No relevant chunks found, generating generic response")
-            generic_response = f"No encontré información específica sobre '{question}' en mi base de conocimiento."
-            return {
-                **state,
-                "generated_response": generic_response,
-                "status": "generation_completed",
-                "confidence": 0.0
-            }
-        
-        # ---------------------- Build context from chunks ----------------------
-        print("   📚 Building context from relevant chunks...")
-        # Sort by score (highest first) so Top-1/Top-3 are truly the best evidence
-        sorted_chunks = sorted(chunks, key=lambda c: c.get("score", 0.0), reverse=True)
-
-        # Prepare human-readable context for the LLM
-        context_sections: list[str] = []
-        for idx, chunk in enumerate(sorted_chunks, start=1):
-            chunk_text: str = chunk.get("text", "")
-            chunk_score: float = float(chunk.get("score", 0.0))
-            context_sections.append(f"Source {idx} (relevance: {chunk_score:.3f}):\n{chunk_text}")
-
-        # ---------------------- Calibrated confidence -------------------------
-        similarity_scores: list[float] = [float(c.get("score", 0.0)) for c in sorted_chunks]
-        calibrated_confidence: float = compute_confidence_from_scores(
-            similarity_scores=similarity_scores,
-            expected_min_similarity=0.20,  # tweak after measuring on your eval set
-            expected_max_similarity=0.70
-        )
-        print(f"   📊 Scores (Top-10): {[round(s, 3) for s in similarity_scores[:10]]}")
-        print(f"   🎯 Calibrated confidence: {calibrated_confidence:.3f}")
-        
-        # ---------------------- Create intelligent prompt ----------------------
-        system_prompt = """Eres un asistente experto en Punta Blanca Solutions. 
-        Tu tarea es responder preguntas basándote en la información proporcionada.
-        
-        INSTRUCCIONES CRÍTICAS:
-        1. Responde SOLO basándote en la información proporcionada
-        2. Si la información es insuficiente, di claramente "No tengo información suficiente sobre [aspecto específico]
-        3. Si hay información en múltiples fuentes, combínala para dar una respuesta completa
-        4. Cita las fuentes más relevantes (con mayor score)
-        5. Responde en español profesional
-        6. Sé preciso y específico
-        
-        Contexto disponible:"""
-        
-        separator = '\n\n'
-        user_prompt = f"""
-        Pregunta del usuario: {question}
-
-        Información relevante (ordenada por relevancia):
-        {separator.join(context_sections)}
-        """
+        messages, calibrated_confidence = _build_generation_request(question, chunks)
         
         # ---------------------- Generate response with OpenAI ----------------------
-        print("   Calling OpenAI API...")
-        openai_client = OpenAI(api_key=settings.openai_api_key)
+        logger.debug("Calling OpenAI chat completion")
+        openai_client = get_async_openai_client()
         
-        response = openai_client.chat.completions.create(
+        response = await openai_client.chat.completions.create(
             model=settings.openai_model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,  # Low temperature for consistent, factual responses
-            max_tokens=500
+            messages=messages,
+            temperature=GENERATION_TEMPERATURE,
+            max_tokens=GENERATION_MAX_TOKENS
         )
         
         generated_response = response.choices[0].message.content.strip()
         
-        print(f"   ✅ Response generated successfully")
-        print(f"   📊 Average confidence: {calibrated_confidence:.3f}")
+        # Prompt-cache hits on the static prefix show up as cached prompt tokens
+        if logger.isEnabledFor(logging.DEBUG) and response.usage is not None:
+            prompt_details = getattr(response.usage, "prompt_tokens_details", None)
+            cached_tokens = prompt_details.get("cached_tokens") if isinstance(prompt_details, dict) else getattr(prompt_details, "cached_tokens", None)
+            logger.debug("Prompt tokens: %d (cached: %s)", response.usage.prompt_tokens, cached_tokens)
+        
+        logger.info("Response generated (confidence: %.3f)", calibrated_confidence)
         
         # ---------------------- Return updated state ----------------------
         return {
-            **state,
             "generated_response": generated_response,
             "confidence": calibrated_confidence,
             "status": "generation_completed"
         }
         
     except Exception as e:
-        print(f"   ❌ Error in generation: {str(e)}")
+        logger.error("Error in generation: %s", e)
         # Return fallback response on error
         fallback_response = f"Sorry, I had a problem generating the response for: '{question}'. Please try again."
         
         return {
-            **state,
             "generated_response": fallback_response,
             "confidence": 0.0,
             "status": "generation_failed",
@@ -294,36 +548,26 @@ def generation_node(state: AgentState) -> AgentState:
 # ====================================================================================================== #
 # NODE 4: OUTPUT NODE - Formats final response
 # ====================================================================================================== #
-def output_node(state: AgentState) -> AgentState:
-
+async def output_node(state: AgentState) -> Dict[str, Any]:
+    # Async so it runs on the event loop like the other nodes (LangGraph would run a sync node on a worker thread)
     response = state.get("generated_response", "")
     chunks = state.get("relevant_chunks", [])
     
-    print(f"📤 Output Node: Formatting response")
-    
-    # Format response according to API specification
-    confidence = state.get("confidence", 0.0)
-    
-    # Debug: Print what we're getting
-    print(f"   📊 Debug - Confidence from state: {confidence}")
-    print(f"   📊 Debug - Raw sources from chunks: {[chunk.get('source', 'unknown') for chunk in chunks]}")
-    
-    # Eliminate duplicates in sources using set
-    unique_sources = list(set([chunk.get("source", "unknown") for chunk in chunks]))
-    print(f"   📊 Debug - Unique sources after deduplication: {unique_sources}")
-    
+    # Format response according to API specification; sources are deduplicated
+    # in one pass while keeping relevance order (deterministic output)
     formatted_response = {
         "answer": response,
-        "sources": unique_sources,
-        "confidence": confidence
+        "sources": _unique_sources(chunks),
+        "confidence": state.get("confidence", 0.0)
     }
     
-    print(f"   📤 Final formatted response: {formatted_response}")
-    print(f"✅ Output Node: Response formatted successfully")
+    logger.debug("Output Node: final response: %s", formatted_response)
+    
+    if state.get("status") == "generation_completed":
+        _store_semantic_answer(state, formatted_response)
     
     # Return final state
     return {
-        **state,
         "final_response": formatted_response,
         "status": "completed"
     }
@@ -331,23 +575,175 @@ def output_node(state: AgentState) -> AgentState:
 
 
 
+# ====================================================================================================== #
+# BATCH - Answer several questions with one embedding request and parallel queries
+# ====================================================================================================== #
+async def run_agent_batch(questions: List[str]) -> List[Dict[str, Any]]:
+    """
+    Answer several questions together.
+
+    Cache misses are embedded with a single OpenAI request, their Pinecone queries run
+    concurrently, and the LLM generations for all questions run concurrently as well.
+    Each question goes through the same semantic cache and nodes as the graph, so cached
+    paraphrases and per-question failures produce the same answers as a single /ask call.
+
+    Args: questions: Raw user questions
+
+    Returns: List of final responses (answer, sources, confidence), in input order
+    """
+    states = [
+        {**build_initial_state(question), "validated_question": question.strip(), "status": "input_validated"}
+        for question in questions
+    ]
+    validated_questions = [state["validated_question"] for state in states]
+    final_responses: List[Optional[Dict[str, Any]]] = [None] * len(states)
+    
+    # Cached retrievals already carry the question embedding; only embed the others, in one request
+    cached_retrievals = await asyncio.gather(*[_get_cached_retrieval(q) for q in validated_questions])
+    question_embeddings = [cached_retrieval[0] if cached_retrieval else None for cached_retrieval in cached_retrievals]
+    to_embed = [i for i, question_embedding in enumerate(question_embeddings) if question_embedding is None]
+    if to_embed:
+        try:
+            for i, question_embedding in zip(to_embed, await embed_questions([validated_questions[i] for i in to_embed])):
+                question_embeddings[i] = question_embedding
+        except Exception as e:
+            logger.error("Error in batch embedding: %s", e)
+            for i in to_embed:
+                states[i] = {**states[i], "relevant_chunks": [], "status": "retrieval_failed", "error": str(e)}
+    
+    # Same semantic cache lookup as the prepare node: paraphrases of answered questions end here
+    for i, question_embedding in enumerate(question_embeddings):
+        if question_embedding is None:
+            continue
+        states[i] = {**states[i], "question_embedding": question_embedding}
+        cached_response = _semantic_cache.lookup(question_embedding)
+        if cached_response is not None:
+            logger.info("Semantic cache hit for: '%s'", validated_questions[i])
+            final_responses[i] = cached_response
+    
+    pending = [i for i in range(len(states)) if final_responses[i] is None and states[i]["status"] == "input_validated"]
+    for i in pending:
+        if cached_retrievals[i] is not None:
+            states[i] = {**states[i], "relevant_chunks": cached_retrievals[i][1], "status": "retrieval_completed"}
+    
+    # Pinecone queries for the remaining misses run concurrently
+    to_query = [i for i in pending if cached_retrievals[i] is None]
+    query_results = await asyncio.gather(
+        *[query_index(validated_questions[i], question_embeddings[i]) for i in to_query],
+        return_exceptions=True
+    )
+    for i, query_result in zip(to_query, query_results):
+        if isinstance(query_result, Exception):
+            logger.error("Error in retrieval: %s", query_result)
+            states[i] = {**states[i], "relevant_chunks": [], "status": "retrieval_failed", "error": str(query_result)}
+            continue
+        await _store_cached_retrieval(validated_questions[i], question_embeddings[i], query_result)
+        states[i] = {**states[i], "relevant_chunks": query_result, "status": "retrieval_completed"}
+    
+    # Generation and output (which stores grounded answers in the semantic cache) for every non-hit
+    to_generate = [i for i in range(len(states)) if final_responses[i] is None]
+    generation_updates = await asyncio.gather(*[generation_node(states[i]) for i in to_generate])
+    for i, generation_update in zip(to_generate, generation_updates):
+        final_responses[i] = (await output_node({**states[i], **generation_update}))["final_response"]
+    return final_responses
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# STREAMING - Same pipeline as the graph, but yields the answer token by token
+# ====================================================================================================== #
+async def stream_agent_response(question: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the prepare node (semantic cache) and retrieval, then stream the LLM answer as it is generated.
+    The completed answer is stored in the semantic cache, as the output node does for /ask.
+
+    Sources and confidence only depend on retrieval, so they are yielded first as a
+    "metadata" event; the answer follows as "token" events. This lets clients render
+    the first words while the rest of the completion is still being generated.
+
+    Args: question: Raw user question
+
+    Yields: Dict events with an "event" key ("metadata" or "token")
+    """
+    state = build_initial_state(question)
+    state = {**state, **await prepare_node(state)}
+
+    cached_response = state.get("final_response")
+    if cached_response is not None:
+        yield {"event": "metadata", "sources": cached_response["sources"], "confidence": cached_response["confidence"]}
+        yield {"event": "token", "content": cached_response["answer"]}
+        return
+
+    state = {**state, **await retrieval_node(state)}
+
+    validated_question = state["validated_question"]
+    chunks = state.get("relevant_chunks", [])
+
+    if not chunks:
+        yield {"event": "metadata", "sources": [], "confidence": 0.0}
+        yield {"event": "token", "content": _no_context_response(validated_question)}
+        return
+
+    messages, calibrated_confidence = _build_generation_request(validated_question, chunks)
+    sources = _unique_sources(chunks)
+    yield {"event": "metadata", "sources": sources, "confidence": calibrated_confidence}
+
+    openai_client = get_async_openai_client()
+    completion_stream = await openai_client.chat.completions.create(
+        model=settings.openai_model,
+        messages=messages,
+        temperature=GENERATION_TEMPERATURE,
+        max_tokens=GENERATION_MAX_TOKENS,
+        stream=True
+    )
+    answer_tokens: List[str] = []
+    async for completion_chunk in completion_stream:
+        if not completion_chunk.choices:
+            continue
+        token = completion_chunk.choices[0].delta.content
+        if token:
+            answer_tokens.append(token)
+            yield {"event": "token", "content": token}
+    
+    # A fully streamed answer is remembered exactly like one produced by the output node
+    _store_semantic_answer(state, {
+        "answer": "".join(answer_tokens).strip(),
+        "sources": sources,
+        "confidence": calibrated_confidence
+    })
+# ====================================================================================================== #
+
+
+
 # ====================================================================================================== #
 # GRAPH DEFINITION - Connect all nodes
 # ====================================================================================================== #
+@lru_cache(maxsize=1)
 def create_agent_graph():
+    """
+    Build and compile the agent workflow.
+
+    The compiled graph is stateless between invocations, so it is memoized and
+    shared by every request instead of being rebuilt on each call.
+    """
     
     # Create workflow with typed state
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("input", input_node)
+    workflow.add_node("prepare", prepare_node)
     workflow.add_node("retrieval", retrieval_node)
     workflow.add_node("generation", generation_node)
     workflow.add_node("output", output_node)
     
-    # Define the flow: input → retrieval → generation → output
-    workflow.set_entry_point("input")
-    workflow.add_edge("input", "retrieval")
+    # Define the flow: prepare → (semantic cache hit: END | miss: retrieval → generation → output)
+    workflow.set_entry_point("prepare")
+    workflow.add_conditional_edges(
+        "prepare",
+        route_after_prepare,
+        ["retrieval", END]
+    )
     workflow.add_edge("retrieval", "generation")
     workflow.add_edge("generation", "output")
     workflow.add_edge("output", END)
@@ -355,7 +751,7 @@ def create_agent_graph():
     # Compile the graph
     compiled_workflow = workflow.compile()
     
-    print("✅ LangGraph agent created successfully!")
+    logger.info("LangGraph agent created successfully")
     return compiled_workflow
 # ====================================================================================================== #
 
@@ -365,27 +761,20 @@ def create_agent_graph():
 # MAIN FUNCTION - For testing
 # ====================================================================================================== #
 def main():
+    logging.basicConfig(level=logging.DEBUG)
     print("🧪 Testing LangGraph Agent...")
     
     # Create the agent
     agent = create_agent_graph()
     
     # Test with sample input (must match AgentState structure)
-    test_input: AgentState = {
-        "question": "¿Quiénes son los fundadores de Punta Blanca y cuáles son sus roles?",
-        "validated_question": None,
-        "relevant_chunks": [],
-        "generated_response": None,
-        "confidence": None,
-        "final_response": None,
-        "status": "started"
-    }
+    test_input = build_initial_state("¿Quiénes son los fundadores de Punta Blanca y cuáles son sus roles?")
     
     print(f"\n📝 Test Input: {test_input['question']}")
     print("=" * 50)
     
     # Run the agent
-    result = agent.invoke(test_input)
+    result = asyncio.run(agent.ainvoke(test_input))
     
     print("\n" + "=" * 50)
     print("🎉 AGENT EXECUTION COMPLETED!")
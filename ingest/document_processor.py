@@ -6,89 +6,224 @@ data folder, extracts text content, splits it into manageable chunks, and saves
 
 The module handles:
     - JSON file reading and parsing
-    - Text chunking with configurable size and overlap
+    - Token-accurate text chunking (tiktoken) with configurable size and overlap, one worker process per file
     - Metadata preservation and chunk identification
-    - Error handling and logging
-    - Output file generation
+    - Error handling and logging (leveled by LOG_LEVEL)
+    - Output file generation (NDJSON, one chunk per line)
 
 Usage:
     - Process documents: process_json_documents(data_folder, chunk_size, chunk_overlap)
+    - Stream chunk batches: iter_chunk_batches(data_folder, chunk_size, chunk_overlap, batch_size)
     - Save chunks: save_chunks_to_json(chunks, output_file)
     - Standalone execution: python document_processor.py
 """
 
 # ====================================================================================================== #
-import json
+import logging
 import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any, Optional
+import orjson
+import tiktoken
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.core.settings import settings
+
+logger = logging.getLogger("pb_rag.ingest")
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
-# Process JSON Documents
+# Tokenizer - chunk lengths are measured in tokens of the embedding model
 # ====================================================================================================== #
-def process_json_documents(data_folder: str = "Data", chunk_size: int = 750, chunk_overlap: int = 150) -> List[Dict[str, Any]]:
+@lru_cache(maxsize=1)
+def get_token_encoding() -> tiktoken.Encoding:
     """
-    This function reads all JSON files from the specified data folder, extracts text content from each file, and splits the text into chunks using LangChain's
-    RecursiveCharacterTextSplitter. Each chunk maintains metadata including sources, section information, and a unique chunk identifier.
-    
-    Args:
-        data_folder: Path to folder containing JSON files (default: "Data")
-        chunk_size: Maximum size of each chunk in characters (default: 800)
-        chunk_overlap: Overlap between consecutive chunks in characters (default: 150)
-        
-    Returns: List of dictionaries, where each dictionary represents a chunk
+    Loaded on first use and then once per process (the BPE tables are the expensive part of
+    tiktoken and may need a download), so importing the ingest modules stays cheap.
+
+    Returns: tiktoken.Encoding: Tokenizer of the configured embedding model (cl100k_base fallback)
     """
+    try:
+        return tiktoken.encoding_for_model(settings.openai_embedding_model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _token_length(text: str) -> int:
+    """
+    Returns: int: Number of embedding-model tokens in text
+    """
+    return len(get_token_encoding().encode(text))
+
 
-    # Initialize text splitter with optimized chunk size and overlap
-    # Chunk size 750: Optimal for maintaining complete context while avoiding abrupt cuts
-    # Overlap 150: Ensures continuity between chunks without excessive redundancy
-    text_splitter = RecursiveCharacterTextSplitter(
+@lru_cache(maxsize=None)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """
+    Returns: RecursiveCharacterTextSplitter: Token-length splitter, built once per process and parameters
+    """
+    return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
+        length_function=_token_length,
     )
+# ====================================================================================================== #
+
+
+
+# ====================================================================================================== #
+# Process JSON Documents
+# ====================================================================================================== #
+def _process_one(json_file: Path, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """
+    Read one JSON document and split its text into chunks. Runs in a worker process
+    and only returns plain dictionaries.
+
+    Args:
+        json_file: Path to the JSON document
+        chunk_size: Maximum size of each chunk in tokens
+        chunk_overlap: Overlap between consecutive chunks in tokens
+
+    Returns: List of chunks of this document (empty on error or missing text)
+    """
+    # Default chunk size 200 tokens (~750 characters of Spanish): complete context without abrupt cuts
+    # Default overlap 40 tokens: Ensures continuity between chunks without excessive redundancy
+    text_splitter = _get_text_splitter(chunk_size, chunk_overlap)
     
     chunks = []
-    data_path = Path(data_folder)
+    try:
+        # Read the raw UTF-8 bytes and parse them with orjson (C decoder)
+        data = orjson.loads(json_file.read_bytes())
         
-    # Process each JSON file in the data folder
-    for json_file in data_path.glob("*.json"):
-        try:
-            # Read and parse JSON file with UTF-8 encoding
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        # Extract required fields from JSON data
+        if 'text' in data:
+            text = data['text']
+            sources = data['sources']
+            section = data['section']
+            
+            # Split text into chunks using LangChain text splitter
+            text_chunks = text_splitter.split_text(text)
+            
+            # Create chunk objects with metadata for each text chunk
+            for i, chunk in enumerate(text_chunks):
+                chunk_data = {
+                    'text': chunk,
+                    'sources': sources,
+                    'chunk_id': f"{section}-{i}",
+                    'section': section,	
+                }
+                chunks.append(chunk_data)
             
-            # Extract required fields from JSON data
-            if 'text' in data:
-                text = data['text']
-                sources = data['sources']
-                section = data['section']
-                
-                # Split text into chunks using LangChain text splitter
-                text_chunks = text_splitter.split_text(text)
-                
-                # Create chunk objects with metadata for each text chunk
-                for i, chunk in enumerate(text_chunks):
-                    chunk_data = {
-                        'text': chunk,
-                        'sources': sources,
-                        'chunk_id': f"{section}-{i}",
-                        'section': section,	
-                    }
-                    chunks.append(chunk_data)
-                
-                print(f"Processed {json_file.name}: {len(text_chunks)} chunks")
-            else:
-                print(f"No 'text' field found in {json_file.name}")
-                
-        except Exception as e:
-            print(f"Error processing {json_file.name}: {e}")
+            logger.debug("Processed %s: %d chunks", json_file.name, len(text_chunks))
+        else:
+            logger.warning("No 'text' field found in %s", json_file.name)
+            
+    except Exception as e:
+        logger.error("Error processing %s: %s", json_file.name, e)
+    
+    return chunks
+
+
+def _iter_file_chunks(
+    data_folder: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    max_workers: Optional[int],
+    executor: Optional[Executor] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields: The chunks of each JSON file in data_folder, one list per file, in file order.
+    A caller-provided executor is used as is and left for the caller to shut down.
+    """
+    json_files = sorted(Path(data_folder).glob("*.json"))
+    
+    # A single file is not worth the cost of spawning worker processes
+    if len(json_files) <= 1:
+        for json_file in json_files:
+            yield _process_one(json_file, chunk_size, chunk_overlap)
+    elif executor is not None:
+        yield from executor.map(_process_one, json_files, repeat(chunk_size), repeat(chunk_overlap))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(
+                _process_one,
+                json_files,
+                repeat(chunk_size),
+                repeat(chunk_overlap)
+            )
+
+
+def process_json_documents(
+    data_folder: str = "Data",
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    max_workers: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    This function reads all JSON files from the specified data folder, extracts text content from each file, and splits the text into chunks using LangChain's
+    RecursiveCharacterTextSplitter. Files are split in parallel worker processes (the splitter is CPU-bound pure Python, so threads would serialize on the GIL).
+    Each chunk maintains metadata including sources, section information, and a unique chunk identifier.
+    
+    Args:
+        data_folder: Path to folder containing JSON files (default: "Data")
+        chunk_size: Maximum size of each chunk in embedding-model tokens (default: settings.chunk_size)
+        chunk_overlap: Overlap between consecutive chunks in tokens (default: settings.chunk_overlap)
+        max_workers: Number of worker processes (default: one per CPU)
+        
+    Returns: List of dictionaries, where each dictionary represents a chunk, in file order
+    """
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.chunk_overlap
+    
+    chunks = [
+        chunk
+        for file_chunks in _iter_file_chunks(data_folder, chunk_size, chunk_overlap, max_workers)
+        for chunk in file_chunks
+    ]
     
-    print(f"Total chunks created: {len(chunks)}")
+    logger.info("Total chunks created: %d", len(chunks))
     return chunks
+
+
+def iter_chunk_batches(
+    data_folder: str = "Data",
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    batch_size: int = 512,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streaming variant of process_json_documents: chunks are regrouped into batches of
+    batch_size as files finish, so callers can embed and upload without holding the corpus.
+    
+    Args:
+        data_folder: Path to folder containing JSON files (default: "Data")
+        chunk_size: Maximum size of each chunk in embedding-model tokens (default: settings.chunk_size)
+        chunk_overlap: Overlap between consecutive chunks in tokens (default: settings.chunk_overlap)
+        batch_size: Number of chunks per yielded batch (default: 512)
+        max_workers: Number of worker processes (default: one per CPU)
+        executor: Process pool to split the files on instead of a pool owned by the generator.
+                  The caller shuts it down, so it is released even if the generator is
+                  abandoned mid-iteration (e.g. while a next() call is still running)
+        
+    Yields: Lists of at most batch_size chunks, in file order
+    """
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.chunk_overlap
+    
+    batch: List[Dict[str, Any]] = []
+    for file_chunks in _iter_file_chunks(data_folder, chunk_size, chunk_overlap, max_workers, executor):
+        batch.extend(file_chunks)
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+    
+    if batch:
+        yield batch
 # ====================================================================================================== #
 
 
@@ -96,24 +231,26 @@ def process_json_documents(data_folder: str = "Data", chunk_size: int = 750, chu
 # ====================================================================================================== #
 # Save Chunks to JSON
 # ====================================================================================================== #
-def save_chunks_to_json(chunks: List[Dict[str, Any]], output_file: str = "data/processed_chunks.json"):
+def save_chunks_to_json(chunks: List[Dict[str, Any]], output_file: str = "data/processed_chunks.jsonl", append: bool = False):
     """
-    This function takes a list of processed chunks and saves them to a JSON file
-    with proper formatting and encoding. 
+    This function takes a list of processed chunks and saves them as NDJSON (one JSON
+    object per line, UTF-8), so readers can stream the file record by record.
     
     Args:
         chunks: List of processed chunks to save
-        output_file: Path and filename for the output JSON file (default: "data/processed_chunks.json")
+        output_file: Path and filename for the output NDJSON file (default: "data/processed_chunks.jsonl")
+        append: Add the chunks to the end of the file instead of overwriting it (streamed batches)
     """
     try:
         file_path = Path(output_file)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
         
-        # Write chunks to JSON file with proper formatting
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, ensure_ascii=False, indent=2)
-        print(f"Chunks saved to {output_file}")
+        # Serialize each chunk with orjson (C encoder) and write one record per line
+        with open(file_path, 'ab' if append else 'wb') as f:
+            f.writelines(orjson.dumps(chunk, option=orjson.OPT_APPEND_NEWLINE) for chunk in chunks)
+        logger.debug("Chunks %s to %s", 'appended' if append else 'saved', output_file)
     except Exception as e:
-        print(f"Error saving chunks: {e}")
+        logger.error("Error saving chunks: %s", e)
 # ====================================================================================================== #
 
 
@@ -124,8 +261,11 @@ if __name__ == "__main__":
     """
     Main execution block for standalone document processing.
     """
+    # Console output is plain messages; LOG_LEVEL=WARNING silences the progress lines
+    logging.basicConfig(level=settings.log_level.upper(), format="%(message)s")
+    
     # Process documents and save chunks
     chunks = process_json_documents()
     if chunks:
-        save_chunks_to_json(chunks, output_file="data/processed_chunks.json")
+        save_chunks_to_json(chunks, output_file="data/processed_chunks.jsonl")
 # ====================================================================================================== #
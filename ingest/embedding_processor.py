@@ -5,113 +5,315 @@ This module processes text chunks and generates embeddings using OpenAI's embedd
 It prepares the chunks with embeddings for storage in Pinecone vector database.
 
 The module handles:
-    - Loading processed chunks from JSON
-    - Generating embeddings using OpenAI API
+    - Loading processed chunks from NDJSON
+    - Reusing embeddings from the persistent on-disk cache for unchanged chunk texts
+    - Generating embeddings using OpenAI API in token-aware batches with retries
+    - Running several batches concurrently with bounded in-flight requests
     - Formatting data for Pinecone storage
-    - Saving processed embeddings to JSON
+    - Saving processed embeddings as .npy arrays (float16 by default, optionally int8 or float32)
 """
 
-import json
+import asyncio
+import logging
+import random
 from pathlib import Path
-from typing import List, Dict, Any
-from openai import OpenAI
+from typing import Iterator, List, Dict, Any, Literal, Optional, Tuple
+import numpy as np
+import orjson
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, BadRequestError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+from app.core import embedding_cache
+from app.core.clients import get_async_openai_client
 from app.core.settings import settings
+from .document_processor import get_token_encoding
+
+logger = logging.getLogger("pb_rag.ingest")
 
 
 # ====================================================================================================== #
-# Load Processed Chunks from JSON file
+# Load Processed Chunks from NDJSON file
 # ====================================================================================================== #
-def load_processed_chunks(chunks_file: str = "data/processed_chunks.json") -> List[Dict[str, Any]]:
+def load_processed_chunks(chunks_file: str = "data/processed_chunks.jsonl") -> List[Dict[str, Any]]:
     """
-    Args: chunks_file: Path to processed chunks file
+    Args: chunks_file: Path to processed chunks file (one JSON object per line)
         
     Returns: List of chunks with text and metadata
     """
     try:
-        with open(chunks_file, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        print(f"Loaded {len(chunks)} chunks from {chunks_file}")
+        with open(chunks_file, 'rb') as f:
+            chunks = [orjson.loads(line) for line in f if line.strip()]
+        logger.info("Loaded %d chunks from %s", len(chunks), chunks_file)
         return chunks
     except Exception as e:
-        print(f"Error loading chunks: {e}")
+        logger.error("Error loading chunks: %s", e)
         return []
 # ====================================================================================================== #
 
 
 
+# ====================================================================================================== #
+# Batching helpers
+# ====================================================================================================== #
+# OpenAI caps the summed input tokens of one embeddings request; stay safely below it
+MAX_TOKENS_PER_REQUEST = 250_000
+
+# Concurrent embeddings requests kept in flight, and the max random delay added before each one
+EMBEDDING_MAX_IN_FLIGHT = 5
+REQUEST_JITTER_SECONDS = 0.25
+
+# Transient API errors worth retrying; anything else (e.g. a bad input) fails fast
+RETRYABLE_OPENAI_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+def _iter_token_aware_batches(chunks: List[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Group chunks into batches of at most batch_size items whose summed token count
+    stays under MAX_TOKENS_PER_REQUEST, preserving the input order.
+
+    Args:
+        chunks: List of chunks with text and metadata
+        batch_size: Maximum number of chunks per request
+
+    Yields: Lists of chunks, one per embeddings request
+    """
+    encoding = get_token_encoding()
+    batch: List[Dict[str, Any]] = []
+    batch_tokens = 0
+    
+    for chunk in chunks:
+        chunk_tokens = len(encoding.encode(chunk['text']))
+        if batch and (len(batch) >= batch_size or batch_tokens + chunk_tokens > MAX_TOKENS_PER_REQUEST):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += chunk_tokens
+    
+    if batch:
+        yield batch
+
+
+@retry(
+    retry=retry_if_exception_type(RETRYABLE_OPENAI_ERRORS),
+    wait=wait_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+async def _embed_texts(openai_client: AsyncOpenAI, texts: List[str]) -> List[List[float]]:
+    """
+    Embed a list of texts in a single request, retrying transient errors with exponential backoff.
+
+    Returns: List of embedding vectors, in the same order as texts
+    """
+    # Small random jitter so concurrent batches do not hit the API in lockstep (thundering-herd 429s)
+    await asyncio.sleep(random.uniform(0, REQUEST_JITTER_SECONDS))
+    embedding_response = await openai_client.embeddings.create(
+        model=settings.openai_embedding_model,
+        input=texts
+    )
+    # Responses carry their input position; order by it to be safe
+    return [item.embedding for item in sorted(embedding_response.data, key=lambda item: item.index)]
+
+
+async def _cache_embeddings(texts: List[str], embedding_vectors: List[List[float]]):
+    """
+    Store freshly generated embeddings in the persistent cache. SQLite access is blocking I/O,
+    so it runs off the event loop; a failed write only costs a cache miss on the next run.
+    """
+    try:
+        await asyncio.to_thread(embedding_cache.put_many, settings.openai_embedding_model, texts, embedding_vectors)
+    except Exception as e:
+        logger.warning("Error writing %d embeddings to the cache: %s", len(texts), e)
+
+
+def _format_for_pinecone(chunk: Dict[str, Any], embedding_vector: List[float]) -> Dict[str, Any]:
+    """
+    Returns: Dict: Chunk formatted as a Pinecone record (id, values, metadata)
+    """
+    return {
+        'id': chunk['chunk_id'],
+        'values': embedding_vector,
+        'metadata': {
+            'text': chunk['text'],
+            'sources': chunk['sources'],
+            'section': chunk['section']
+        }
+    }
+# ====================================================================================================== #
+
+
+
 # ====================================================================================================== #
 # Generate Embeddings for Chunks using OpenAI
 # ====================================================================================================== #
-def generate_embeddings_for_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+async def _embed_batch(
+    openai_client: AsyncOpenAI,
+    semaphore: asyncio.Semaphore,
+    batch_number: int,
+    batch: List[Dict[str, Any]]
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    Embed one batch of chunks while holding a concurrency slot, then cache the new vectors.
+
+    Returns: Tuple of (batch_number, chunks formatted for Pinecone) so results can be reassembled in order
+    """
+    texts = [chunk['text'] for chunk in batch]
+    async with semaphore:
+        try:
+            embedding_vectors = await _embed_texts(openai_client, texts)
+        except BadRequestError as e:
+            # Fall back to one request per chunk so a single bad text does not drop the whole batch.
+            # Transient errors that outlived the retries propagate instead: splitting a rate-limited
+            # batch into one request per chunk would only add load
+            logger.warning("Error generating embeddings for batch of %d chunks: %s. Retrying chunk by chunk...", len(batch), e)
+            embedded_chunks, embedding_vectors = [], []
+            for chunk in batch:
+                try:
+                    embedding_vectors.append((await _embed_texts(openai_client, [chunk['text']]))[0])
+                    embedded_chunks.append(chunk)
+                except BadRequestError as chunk_error:
+                    logger.error("Error generating embedding for chunk %s: %s", chunk['chunk_id'], chunk_error)
+            batch, texts = embedded_chunks, [chunk['text'] for chunk in embedded_chunks]
+    
+    # Outside the API slot and the retry/fallback path: a cache write never fails the batch
+    if batch:
+        await _cache_embeddings(texts, embedding_vectors)
+    return batch_number, [_format_for_pinecone(chunk, vector) for chunk, vector in zip(batch, embedding_vectors)]
+
+
+async def generate_embeddings_for_chunks(
+    chunks: List[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT
+) -> List[Dict[str, Any]]:
     """    
-    Args: chunks: List of chunks with text and metadata
+    Args:
+        chunks: List of chunks with text and metadata
+        batch_size: Maximum chunks per embeddings request (default: settings.embedding_batch_size)
+        max_in_flight: Maximum number of embeddings requests running concurrently (default: 5)
         
-    Returns: List of chunks with embeddings and metadata ready for Pinecone
+    Returns: List of chunks with embeddings and metadata ready for Pinecone, in input order.
+             Each record's 'values' is a float32 row view of one contiguous matrix
     """
-    # Initialize OpenAI client with API key from settings
-    openai_client = OpenAI(api_key=settings.openai_api_key)
+    batch_size = batch_size or settings.embedding_batch_size
     
-    chunks_with_embeddings = []
+    # Reuse cached vectors for unchanged texts; only the misses are sent to the API
+    # (SQLite access is blocking I/O; keep it off the event loop shared with the upload stage)
+    cached_vectors = await asyncio.to_thread(
+        embedding_cache.get_many, settings.openai_embedding_model, [chunk['text'] for chunk in chunks]
+    )
+    cached_records = {
+        chunk['chunk_id']: _format_for_pinecone(chunk, vector)
+        for chunk, vector in zip(chunks, cached_vectors) if vector is not None
+    }
+    pending_chunks = [chunk for chunk in chunks if chunk['chunk_id'] not in cached_records]
+    logger.debug("Embedding cache: %d hits, %d misses", len(cached_records), len(pending_chunks))
     
-    # Process each chunk to generate embeddings
-    for i, chunk in enumerate(chunks):
-        try:
-            # Generate embedding using OpenAI API
-            embedding_response = openai_client.embeddings.create(
-                model=settings.openai_embedding_model,
-                input=chunk['text']
-            )
-            
-            # Extract embedding vector from response
-            embedding_vector = embedding_response.data[0].embedding
-            
-            # Format chunk data for Pinecone storage
-            chunk_data = {
-                'id': chunk['chunk_id'],
-                'values': embedding_vector,
-                'metadata': {
-                    'text': chunk['text'],
-                    'sources': chunk['sources'],
-                    'section': chunk['section']
-                }
-            }
-            
-            chunks_with_embeddings.append(chunk_data)
-            
-            # Show progress every 10 chunks
-            if (i + 1) % 10 == 0:
-                print(f"Processed {i + 1}/{len(chunks)} chunks")
-                
-        except Exception as e:
-            print(f"Error generating embedding for chunk {chunk['chunk_id']}: {e}")
-            continue
+    batches = list(_iter_token_aware_batches(pending_chunks, batch_size))
+    semaphore = asyncio.Semaphore(max_in_flight)
+    
+    # Shared async OpenAI client (one connection pool for every batch)
+    openai_client = get_async_openai_client()
+    tasks = [
+        asyncio.create_task(_embed_batch(openai_client, semaphore, batch_number, batch))
+        for batch_number, batch in enumerate(batches)
+    ]
+    
+    # Report progress as batches complete
+    embedded_records: Dict[str, Dict[str, Any]] = {}
+    processed = 0
+    try:
+        for completed in asyncio.as_completed(tasks):
+            batch_number, formatted_chunks = await completed
+            embedded_records.update((record['id'], record) for record in formatted_chunks)
+            processed += len(batches[batch_number])
+            logger.debug("Processed %d/%d chunks", processed, len(pending_chunks))
+    except BaseException:
+        # A transient API error outlived its retries: stop the sibling batches instead of
+        # leaving them to spend quota on a run that is already failing
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
     
-    print(f"Generated embeddings for {len(chunks_with_embeddings)} chunks")
+    # Reassemble cached and freshly embedded records in input order
+    chunks_with_embeddings = [
+        cached_records.get(chunk['chunk_id']) or embedded_records[chunk['chunk_id']]
+        for chunk in chunks
+        if chunk['chunk_id'] in cached_records or chunk['chunk_id'] in embedded_records
+    ]
+    
+    # Pack the vectors into one float32 matrix and point each record at its row: 6 KB per
+    # 1536-dim vector instead of ~50 KB of boxed Python floats, and batches slice without copies
+    if chunks_with_embeddings:
+        vectors = np.asarray([record['values'] for record in chunks_with_embeddings], dtype=np.float32)
+        for record, row in zip(chunks_with_embeddings, vectors):
+            record['values'] = row
+    logger.debug("Generated embeddings for %d chunks", len(chunks_with_embeddings))
     return chunks_with_embeddings
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
-# Save Embeddings to JSON file
+# Save Embeddings to a directory of .npy arrays
 # ====================================================================================================== #
-def save_embeddings_to_json(chunks_with_embeddings: List[Dict[str, Any]], output_file: str = "data/embeddings_processed.json"):
+def _quantize_vectors(vectors: np.ndarray, quantize: str) -> Dict[str, np.ndarray]:
+    """
+    Returns: Dict of stored arrays: 'vectors' in the requested dtype, plus per-vector
+    'offsets' and 'scales' for int8 (min/max scalar quantization, v ≈ (q + 128) * scale + offset)
     """
+    if quantize == 'none':
+        return {'vectors': vectors}
+    if quantize == 'fp16':
+        return {'vectors': vectors.astype(np.float16)}
+    
+    offsets = vectors.min(axis=1, keepdims=True)
+    scales = (vectors.max(axis=1, keepdims=True) - offsets) / 255
+    # Constant vectors would divide by zero; any scale reproduces them exactly
+    scales[scales == 0] = 1
+    quantized = np.round((vectors - offsets) / scales - 128).astype(np.int8)
+    return {'vectors': quantized, 'offsets': offsets.ravel(), 'scales': scales.ravel()}
+
+
+def save_embeddings(
+    chunks_with_embeddings: List[Dict[str, Any]],
+    output_dir: str = "data/embeddings_processed",
+    quantize: Literal['none', 'fp16', 'int8'] = 'fp16'
+):
+    """
+    Persist embeddings as a directory of plain .npy files: 'ids.npy' (fixed-width strings),
+    'vectors.npy' as one matrix and 'metadata.json' (orjson-encoded list). .npy arrays have a
+    typed header, so pinecone_uploader.load_embeddings memory-maps them instead of parsing,
+    and no pickling is needed to load them back. float16 halves the bytes of float32; int8
+    quarters them at a small recall cost, so it is opt-in. Pinecone only ingests float32,
+    so vectors are restored to float32 when they are uploaded.
+
     Args:
         chunks_with_embeddings: List of chunks with embeddings
-        output_file: Output file name
+        output_dir: Output directory (created if missing, existing arrays are replaced)
+        quantize: Vector storage format: 'none' (float32), 'fp16' (default) or 'int8'
     """
     try:
         # Create output directory if it doesn't exist
-        output_path = Path(output_file)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
         
-        # Save embeddings to JSON file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(chunks_with_embeddings, f, ensure_ascii=False, indent=2)
-        print(f"Embeddings saved to {output_file}")
+        vectors = np.asarray([record['values'] for record in chunks_with_embeddings], dtype=np.float32)
+        arrays = {
+            'ids': np.array([record['id'] for record in chunks_with_embeddings], dtype=str),
+            **_quantize_vectors(vectors, quantize),
+        }
+        # Drop the int8 parameters of a previous save, or the loader would dequantize float vectors
+        for stale_name in ('offsets', 'scales'):
+            (output_path / f"{stale_name}.npy").unlink(missing_ok=True)
+        for name, array in arrays.items():
+            np.save(output_path / f"{name}.npy", array)
+        (output_path / "metadata.json").write_bytes(
+            orjson.dumps([record['metadata'] for record in chunks_with_embeddings])
+        )
+        logger.info("Embeddings saved to %s", output_dir)
     except Exception as e:
-        print(f"Error saving embeddings: {e}")
+        logger.error("Error saving embeddings: %s", e)
 # ====================================================================================================== #
 
 
@@ -121,20 +323,23 @@ def save_embeddings_to_json(chunks_with_embeddings: List[Dict[str, Any]], output
 # ====================================================================================================== #
 def main():
 
+    # Console output is plain messages; LOG_LEVEL=WARNING silences the progress lines
+    logging.basicConfig(level=settings.log_level.upper(), format="%(message)s")
+    
     # Load processed chunks from JSON file
     chunks = load_processed_chunks()
     if not chunks:
-        print("No chunks to process")
+        logger.warning("No chunks to process")
         return
     
     # Generate embeddings for all chunks
-    chunks_with_embeddings = generate_embeddings_for_chunks(chunks)
+    chunks_with_embeddings = asyncio.run(generate_embeddings_for_chunks(chunks))
     if chunks_with_embeddings:
         # Save processed embeddings ready for Pinecone
-        save_embeddings_to_json(chunks_with_embeddings)
-        print("Embedding generation completed successfully!")
+        save_embeddings(chunks_with_embeddings)
+        logger.info("Embedding generation completed successfully! (%d chunks)", len(chunks_with_embeddings))
     else:
-        print("No embeddings were generated")
+        logger.warning("No embeddings were generated")
 # ====================================================================================================== #
 
 
@@ -5,39 +5,139 @@ This module uploads processed chunks with embeddings to Pinecone vector database
 It handles batch processing and provides progress tracking for large uploads.
 
 The module handles:
-    - Loading processed embeddings from JSON
-    - Batch uploading to Pinecone index
+    - Loading processed embeddings from memory-mapped .npy arrays
+    - Concurrent batch uploading to Pinecone index (async gRPC upserts with retries)
     - Progress tracking and error handling
     - Connection management to Pinecone
 """
 
 # ====================================================================================================== #
-import json
+import asyncio
+import itertools
+import logging
 from pathlib import Path
-from typing import List, Dict, Any
-from pinecone import Pinecone
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import grpc
+import numpy as np
+import orjson
+from pinecone.exceptions import PineconeApiException
+from pinecone.grpc import GRPCVector
+from pinecone.grpc.utils import dict_to_proto_struct
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from app.core.clients import get_pinecone_executor, get_pinecone_index
 from app.core.settings import settings
+
+logger = logging.getLogger("pb_rag.ingest")
 # ====================================================================================================== #
 
 
 
 # ====================================================================================================== #
-# Load Processed Embeddings from JSON file
+# Load Processed Embeddings from the .npy directory
 # ====================================================================================================== #
-def load_embeddings(embeddings_file: str = "data/embeddings_processed.json") -> List[Dict[str, Any]]:
+class EmbeddingStore:
+    """
+    Read-only view over the arrays written by embedding_processor.save_embeddings. ids and
+    vectors are memory-mapped, so opening the store only reads the .npy headers; vector rows
+    are paged in from disk when they are sliced, and restored to float32 (dequantizing int8)
+    one slice at a time. Indexing with a slice returns upsert-ready records whose 'values'
+    are rows of that float32 slice, so no per-float Python objects are created.
+
+    Attributes:
+        ids: Memory-mapped array of vector ids
+        vectors: Memory-mapped matrix of stored vectors (float16, int8 or float32)
+    """
+
+    def __init__(self, embeddings_dir: str = "data/embeddings_processed"):
+        self._directory = Path(embeddings_dir)
+        self.ids = np.load(self._directory / "ids.npy", mmap_mode='r')
+        self.vectors = np.load(self._directory / "vectors.npy", mmap_mode='r')
+        # int8 stores carry the per-vector dequantization parameters
+        self._offsets = self._load_optional("offsets.npy")
+        self._scales = self._load_optional("scales.npy")
+        self._metadata: Optional[List[Dict[str, Any]]] = None
+
+    def _load_optional(self, file_name: str) -> Optional[np.ndarray]:
+        path = self._directory / file_name
+        return np.load(path, mmap_mode='r')[:, None] if path.exists() else None
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        """
+        Returns: List of per-vector metadata, parsed on first access
+        """
+        if self._metadata is None:
+            self._metadata = orjson.loads((self._directory / "metadata.json").read_bytes())
+        return self._metadata
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """
+        Returns: np.ndarray: float32 matrix of vectors [start, stop), as Pinecone upserts expect
+        """
+        # astype copies out of the memmap, so the result no longer depends on the open file
+        batch_vectors = self.vectors[start:stop].astype(np.float32)
+        if self._scales is not None:
+            batch_vectors = (batch_vectors + 128) * self._scales[start:stop] + self._offsets[start:stop]
+        return batch_vectors
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("EmbeddingStore only supports contiguous slices")
+            return [
+                {'id': vector_id, 'values': values, 'metadata': vector_metadata}
+                for vector_id, values, vector_metadata in zip(
+                    self.ids[start:stop].tolist(),
+                    self.rows(start, stop),
+                    self.metadata[start:stop]
+                )
+            ]
+        position = range(len(self))[index]
+        return self[position:position + 1][0]
+
+    def iter_batches(self, batch_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields: Lists of up to batch_size records (id, values, metadata), in stored order
+        """
+        for start in range(0, len(self), batch_size):
+            yield self[start:start + batch_size]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return itertools.chain.from_iterable(self.iter_batches())
+
+
+def iter_embedding_batches(embeddings_dir: str = "data/embeddings_processed", batch_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
     """
-    Args: embeddings_file: Path to embeddings file
+    Stream the stored embeddings as upsert-ready batches of row-range slices, so the full
+    record list is never materialized.
+
+    Args: embeddings_dir: Directory written by embedding_processor.save_embeddings
+          batch_size: Number of records per batch
         
-    Returns: List of chunks with embeddings ready for Pinecone
+    Yields: Lists of records (id, values, metadata) ready for Pinecone
+    """
+    yield from EmbeddingStore(embeddings_dir).iter_batches(batch_size)
+
+
+def load_embeddings(embeddings_dir: str = "data/embeddings_processed") -> Optional[EmbeddingStore]:
+    """
+    Args: embeddings_dir: Directory written by embedding_processor.save_embeddings
+        
+    Returns: EmbeddingStore: Memory-mapped view of the embeddings (index or slice it for records),
+             or None if they could not be opened
     """
     try:
-        with open(embeddings_file, 'r', encoding='utf-8') as f:
-            embeddings = json.load(f)
-        print(f"Loaded {len(embeddings)} embeddings from {embeddings_file}")
+        embeddings = EmbeddingStore(embeddings_dir)
+        logger.info("Loaded %d embeddings from %s", len(embeddings), embeddings_dir)
         return embeddings
     except Exception as e:
-        print(f"Error loading embeddings: {e}")
-        return []
+        logger.error("Error loading embeddings: %s", e)
+        return None
 # ====================================================================================================== #
 
 
@@ -45,55 +145,264 @@ def load_embeddings(embeddings_file: str = "data/embeddings_processed.json") ->
 # ====================================================================================================== #
 # Upload Embeddings to Pinecone
 # ====================================================================================================== #
-def upload_to_pinecone(embeddings: List[Dict[str, Any]], batch_size: int = 100) -> bool:
+UPSERT_CONCURRENCY = 16
+
+# Pinecone rejects upsert requests over 2 MB or 1000 vectors; pack batches just under the byte cap
+UPSERT_MAX_BYTES = 1_800_000
+UPSERT_MAX_VECTORS = 1000
+
+# Ids per fetch request when checking which vectors already exist (fetch returns full vectors)
+FETCH_ID_BATCH = 200
+
+# gRPC statuses worth retrying: throttling, overload and dropped connections
+RETRYABLE_GRPC_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.ABORTED,
+    grpc.StatusCode.INTERNAL,
+}
+
+
+def _record_size(record: Dict[str, Any]) -> int:
     """
-    Args: embeddings: List of embeddings ready for Pinecone
-          batch_size: Number of vectors to upload per batch
-        
-    Returns: bool: True if successful, False otherwise
+    Returns: int: Approximate request bytes of one record (float32 values, metadata JSON, id)
     """
-    try:
-        # Initialize Pinecone client with API key from settings
-        pinecone_client = Pinecone(api_key=settings.pinecone_api_key)
-        
-        # Get the specified index from settings
-        index = pinecone_client.Index(settings.pinecone_index)
-        
-        print(f"Connected to Pinecone index: {settings.pinecone_index}")
+    return len(record['values']) * 4 + len(orjson.dumps(record['metadata'])) + len(record['id']) + 16
+
+
+def pack_upsert_batches(records: Iterable[Dict[str, Any]], batch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Group records into upsert batches. By default batches are packed greedily by payload
+    bytes, so short chunks share one request and metadata-heavy ones never exceed the limit.
+
+    Args: records: Records ready for Pinecone (id, values, metadata), consumed lazily
+          batch_size: Fixed number of records per batch instead of byte-based packing
         
-        # Upload embeddings in configurable batches
-        total_uploaded = 0
+    Yields: Lists of records, one per upsert request
+    """
+    record_iterator = iter(records)
+    if batch_size:
+        while batch := list(itertools.islice(record_iterator, batch_size)):
+            yield batch
+        return
+    
+    batch: List[Dict[str, Any]] = []
+    batch_bytes = 0
+    for record in record_iterator:
+        record_bytes = _record_size(record)
+        if batch and (batch_bytes + record_bytes > UPSERT_MAX_BYTES or len(batch) >= UPSERT_MAX_VECTORS):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(record)
+        batch_bytes += record_bytes
+    
+    if batch:
+        yield batch
+
+
+async def _await_grpc_future(future) -> Any:
+    """
+    Bridge a gRPC future (completed on a gRPC thread) into the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    bridged = loop.create_future()
+    
+    def _transfer(_):
+        if bridged.cancelled():
+            return
+        try:
+            bridged.set_result(future.result())
+        except Exception as e:
+            bridged.set_exception(e)
+    
+    future.add_done_callback(lambda done: loop.call_soon_threadsafe(_transfer, done))
+    return await bridged
+
+
+def _to_grpc_vectors(batch: List[Dict[str, Any]]) -> List[GRPCVector]:
+    """
+    Build the gRPC Vector messages directly from the records. This skips the SDK's per-dict
+    key validation and conversion, and leaves the records untouched (the SDK overwrites
+    dict metadata with protobuf Structs in place).
+    """
+    return [
+        GRPCVector(id=record['id'], values=record['values'], metadata=dict_to_proto_struct(record['metadata']))
+        for record in batch
+    ]
+
+
+def _is_transient(error: BaseException) -> bool:
+    """
+    Returns: bool: True for throttling (429), server-side (5xx) and connection errors, which are
+             worth retrying; invalid requests fail straight away
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, PineconeApiException):
+        return error.status is not None and (error.status == 429 or error.status >= 500)
+    # The gRPC future wraps the RpcError in a PineconeException, keeping it as the cause
+    cause = error.__cause__
+    return isinstance(cause, grpc.RpcError) and cause.code() in RETRYABLE_GRPC_CODES
+
+
+@retry(
+    wait=wait_exponential_jitter(initial=0.5, max=30),
+    stop=stop_after_attempt(6),
+    retry=retry_if_exception(_is_transient),
+    reraise=True,
+)
+async def _upsert_batch(index, vectors: List[GRPCVector]):
+    """
+    Upsert one batch, retrying transient errors with jittered exponential backoff so a 429 or 503
+    does not drop it and concurrent batches throttled together do not retry in lockstep.
+    """
+    await _await_grpc_future(index.upsert(vectors=vectors, async_req=True))
+
+
+async def _fetch_existing_ids(index, ids: List[str]) -> Set[str]:
+    """
+    Look up which ids are already stored in the index. gRPC fetch has no async variant,
+    so the sub-requests run concurrently on the shared Pinecone executor.
+
+    Returns: Set[str]: The subset of ids present in the index
+    """
+    loop = asyncio.get_running_loop()
+    responses = await asyncio.gather(*[
+        loop.run_in_executor(get_pinecone_executor(), partial(index.fetch, ids=ids[start:start + FETCH_ID_BATCH]))
+        for start in range(0, len(ids), FETCH_ID_BATCH)
+    ])
+    return {vector_id for response in responses for vector_id in response.vectors}
+
+
+async def upsert_batches(
+    index,
+    batches: Iterable[List[Dict[str, Any]]],
+    concurrency: int,
+    skip_existing: bool = False
+) -> Tuple[int, List[List[Dict[str, Any]]]]:
+    """
+    Upsert batches concurrently, keeping at most `concurrency` requests in flight. A slot is
+    taken before the next batch is pulled, so a lazy batch iterator is only read as fast as
+    the uploads progress. With skip_existing, ids already in the index are dropped from each
+    batch first, so a re-run after a failure only uploads the missing vectors.
+    Batches that still fail after retries are re-attempted once at the end, split into halves,
+    so a request rejected for its size or a throttled burst gets a second, lighter chance.
+
+    Returns: Tuple[int, List[List[Dict]]]: Vectors uploaded, and the batches that still failed
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    total_uploaded = 0
+    total_skipped = 0
+    failed: List[List[Dict[str, Any]]] = []
+    
+    async def upsert_bounded(batch_number: int, batch: List[Dict[str, Any]]):
+        nonlocal total_uploaded, total_skipped
+        try:
+            if skip_existing:
+                try:
+                    existing_ids = await _fetch_existing_ids(index, [record['id'] for record in batch])
+                except Exception as e:
+                    # Uploading again is harmless (upserts are idempotent), so a failed check just skips nothing
+                    logger.warning("Error checking existing ids for batch %d: %s", batch_number, e)
+                    existing_ids = set()
+                if existing_ids:
+                    batch = [record for record in batch if record['id'] not in existing_ids]
+                    total_skipped += len(existing_ids)
+                if not batch:
+                    return
+            await _upsert_batch(index, _to_grpc_vectors(batch))
+        except Exception as e:
+            logger.error("Error uploading batch %d: %s", batch_number, e)
+            failed.append(batch)
+            return
+        finally:
+            semaphore.release()
+        total_uploaded += len(batch)
+        logger.debug("Uploaded batch %d: %d vectors (Total: %d)", batch_number, len(batch), total_uploaded)
+    
+    async def upsert_all(batches: Iterable[List[Dict[str, Any]]]):
+        tasks = []
+        for batch_number, batch in enumerate(batches, start=1):
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(upsert_bounded(batch_number, batch)))
+        await asyncio.gather(*tasks)
+    
+    await upsert_all(batches)
+    
+    if failed:
+        retry_size = max(1, max(len(batch) for batch in failed) // 2)
+        logger.warning("Retrying %d failed batches with up to %d vectors each", len(failed), retry_size)
+        retry_batches = pack_upsert_batches(itertools.chain.from_iterable(failed), retry_size)
+        failed = []
+        await upsert_all(retry_batches)
+    
+    if skip_existing:
+        logger.debug("Skipped %d vectors already in the index", total_skipped)
+    logger.debug("Upload completed! Total vectors uploaded: %d", total_uploaded)
+    return total_uploaded, failed
+
+
+def upload_batches_to_pinecone(
+    batches: Iterable[List[Dict[str, Any]]],
+    concurrency: int = UPSERT_CONCURRENCY,
+    index=None,
+    skip_existing: bool = False
+) -> Tuple[int, List[List[Dict[str, Any]]]]:
+    """
+    Upsert pre-built batches (e.g. streamed by iter_embedding_batches) with up to `concurrency` in flight.
+
+    Args: batches: Iterable of record lists ready for Pinecone (id, values, metadata)
+          concurrency: Maximum number of batch upserts in flight (default: 16)
+          index: Index handle to upsert into (default: the shared gRPC index)
+          skip_existing: Only upload ids not yet in the index (resume after a failed run)
         
-        for i in range(0, len(embeddings), batch_size):
-            batch = embeddings[i:i + batch_size]
-            
-            try:
-                # Prepare batch data for Pinecone upsert
-                vectors = []
-                for embedding in batch:
-                    vector_data = {
-                        'id': embedding['id'],
-                        'values': embedding['values'],
-                        'metadata': embedding['metadata']
-                    }
-                    vectors.append(vector_data)
-                
-                # Upload batch to Pinecone using upsert
-                index.upsert(vectors=vectors)
-                
-                total_uploaded += len(batch)
-                print(f"Uploaded batch {i//batch_size + 1}: {len(batch)} vectors (Total: {total_uploaded})")
-                
-            except Exception as e:
-                print(f"Error uploading batch {i//batch_size + 1}: {e}")
-                continue
+    Returns: Tuple[int, List[List[Dict]]]: Vectors uploaded, and the batches that failed after
+             retries (empty when everything was uploaded)
+    """
+    try:
+        # Shared gRPC index handle (one connection reused for every batch and call)
+        index = index or get_pinecone_index()
         
-        print(f"Upload completed! Total vectors uploaded: {total_uploaded}")
-        return True
+        logger.info("Connected to Pinecone index: %s", settings.pinecone_index)
         
     except Exception as e:
-        print(f"Error connecting to Pinecone: {e}")
-        return False
+        logger.error("Error connecting to Pinecone: %s", e)
+        return 0, list(batches)
+    
+    uploaded, failed_batches = asyncio.run(upsert_batches(index, batches, concurrency, skip_existing))
+    if failed_batches:
+        logger.error(
+            "%d batches (%d vectors) failed after retries",
+            len(failed_batches), sum(len(batch) for batch in failed_batches)
+        )
+    return uploaded, failed_batches
+
+
+def upload_to_pinecone(
+    embeddings: Sequence[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    concurrency: int = UPSERT_CONCURRENCY,
+    index=None,
+    skip_existing: bool = False
+) -> Tuple[int, List[List[Dict[str, Any]]]]:
+    """
+    Upsert vectors in batches, all issued concurrently with up to `concurrency` in flight.
+    The gRPC index returns a future per async upsert, so no extra threads are needed.
+
+    Args: embeddings: List of embeddings ready for Pinecone (id, values, metadata), or an EmbeddingStore
+          batch_size: Fixed number of vectors per batch (default: packed by payload bytes, up to ~1.8 MB)
+          concurrency: Maximum number of batch upserts in flight (default: 16)
+          index: Index handle to upsert into (default: the shared gRPC index)
+          skip_existing: Only upload ids not yet in the index. Stored vectors are not compared, so
+                         a chunk whose text changed under the same id is left as it was
+        
+    Returns: Tuple[int, List[List[Dict]]]: Vectors uploaded, and the batches that failed after
+             retries, so the caller can retry just those
+    """
+    return upload_batches_to_pinecone(
+        pack_upsert_batches(embeddings, batch_size), concurrency, index=index, skip_existing=skip_existing
+    )
 # ====================================================================================================== #
 
 
@@ -103,21 +412,29 @@ def upload_to_pinecone(embeddings: List[Dict[str, Any]], batch_size: int = 100)
 # ====================================================================================================== #
 def main():
 
-    # Load embeddings from JSON file
+    # Console output is plain messages; LOG_LEVEL=WARNING silences the progress lines
+    logging.basicConfig(level=settings.log_level.upper(), format="%(message)s")
+    
+    # Memory-mapped view: records are built slice by slice as the upserts consume them
     embeddings = load_embeddings()
-    if not embeddings:
-        print("No embeddings to upload")
+    if embeddings is None:
+        return
+    if not len(embeddings):
+        logger.warning("No embeddings to upload")
         return
     
     # Upload all embeddings to Pinecone
-    print(f"Starting upload of {len(embeddings)} vectors to Pinecone...")
-    upload_success = upload_to_pinecone(embeddings)
+    logger.info("Starting upload of data/embeddings_processed to Pinecone...")
+    uploaded, failed_batches = upload_to_pinecone(embeddings)
     
-    if upload_success:
+    if not failed_batches:
         # Confirm successful upload completion
-        print("Pinecone upload completed successfully!")
+        logger.info("Pinecone upload completed successfully! (%d vectors)", uploaded)
     else:
-        print("Pinecone upload failed!")
+        logger.error(
+            "Pinecone upload incomplete: %d vectors missing. Re-run to upload them "
+            "(upserts are idempotent)", sum(len(batch) for batch in failed_batches)
+        )
 # ====================================================================================================== #
 
 
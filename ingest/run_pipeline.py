@@ -5,18 +5,26 @@ This module orchestrates the complete data processing pipeline from JSON files t
 It coordinates document processing, embedding generation, and vector database upload.
 
 The module handles:
-    - JSON document processing and chunking
-    - OpenAI embedding generation
-    - Pinecone vector database upload
+    - Streaming the corpus in batches: chunking, embedding generation and Pinecone upload per batch
+    - Optional background persistence of the intermediate chunks and embeddings
     - Progress tracking and timing metrics
     - Pipeline status reporting
 """
 
 # ====================================================================================================== #
+import argparse
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from .document_processor import process_json_documents, save_chunks_to_json
-from .embedding_processor import generate_embeddings_for_chunks, save_embeddings_to_json
-from .pinecone_uploader import upload_to_pinecone
+from typing import Any, Dict, List, Optional
+from app.core.clients import get_pinecone_index
+from app.core.settings import settings
+from .document_processor import iter_chunk_batches, save_chunks_to_json
+from .embedding_processor import generate_embeddings_for_chunks, save_embeddings
+from .pinecone_uploader import UPSERT_CONCURRENCY, pack_upsert_batches, upsert_batches
+
+logger = logging.getLogger("pb_rag.ingest")
 # ====================================================================================================== #
 
 
@@ -24,63 +32,163 @@ from .pinecone_uploader import upload_to_pinecone
 # ====================================================================================================== #
 # Run the complete pipeline from start to finish
 # ====================================================================================================== #
-def run_complete_pipeline(data_folder: str = "data", chunk_size: int = 750, chunk_overlap: int = 150):
+# Batches buffered between stages; enough to keep the next stage busy without holding the corpus
+STAGE_QUEUE_SIZE = 2
+
+
+async def _stream_pipeline(
+    data_folder: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    batch_size: int,
+    persist_intermediate: bool,
+    skip_existing: bool
+) -> Dict[str, Any]:
     """
-    Args: data_folder: Folder containing JSON files
-           chunk_size: Size of each chunk (default: 800 - optimized for context preservation)
-           chunk_overlap: Overlap between chunks (default: 150 - optimal continuity)
+    Chunk, embed and upsert the corpus as three concurrent stages joined by bounded queues:
+    while batch N is being upserted, batch N+1 is already being embedded and batch N+2 chunked.
+    Embedding (OpenAI) and upload (Pinecone) wait on different services, so the run takes
+    roughly the slower of the two instead of their sum, and memory stays bounded by a few batches
+    (records are only kept for the whole run when persist_intermediate asks to save them).
+
+    Returns: Dict with the chunk, embedding and upload counts and the failed batch and vector counts
     """
-    print("🚀 Starting complete pipeline...")
-    print("=" * 50)
-    print(f"⚙️  Using optimized parameters: chunk_size={chunk_size}, overlap={chunk_overlap}")
-    print("   • Chunk size 800: Optimal for maintaining complete context")
-    print("   • Overlap 150: Ensures continuity between chunks")
-    print("=" * 50)
-    
-    # Step 1: Process JSON documents into chunks
-    print("\n📄 STEP 1: Processing JSON documents into chunks...")
-    
-    chunks = process_json_documents(data_folder=data_folder, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    if not chunks:
-        print("❌ No chunks generated. Pipeline stopped.")
-        return False
+    stats = {'chunks': 0, 'embeddings': 0, 'uploaded': 0, 'failed_batches': 0, 'failed_vectors': 0}
+    collected_records: List[Dict[str, Any]] = []
     
-    # Save processed chunks to JSON file
-    save_chunks_to_json(chunks, output_file="data/processed_chunks.json")
-    print(f"✅ Chunks generated: {len(chunks)}")
+    # Shared gRPC index handle (one connection reused for every batch)
+    index = get_pinecone_index()
     
-    # Step 2: Generate embeddings for chunks
-    print("\n🧠 STEP 2: Generating embeddings...")
+    # Intermediate files are written on one background thread (keeps the appends in order),
+    # so disk I/O overlaps with embedding and upload instead of stalling the batch loop
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist") if persist_intermediate else None
+    if writer:
+        Path("data/processed_chunks.jsonl").unlink(missing_ok=True)
     
-    chunks_with_embeddings = generate_embeddings_for_chunks(chunks)
-    if not chunks_with_embeddings:
-        print("❌ No embeddings generated. Pipeline stopped.")
-        return False
+    # None marks the end of the stream on each queue
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    record_queue: asyncio.Queue = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    
+    # The chunking worker pool belongs to the pipeline rather than to the chunk generator: a
+    # cancelled stage can leave the generator mid-next() on a thread, where it cannot be closed
+    chunk_executor = ProcessPoolExecutor()
+    
+    async def chunk_stage():
+        chunk_batches = iter_chunk_batches(
+            data_folder=data_folder, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            batch_size=batch_size, executor=chunk_executor
+        )
+        # Chunking blocks on worker processes, so pull each batch off the event loop
+        while (chunk_batch := await asyncio.to_thread(next, chunk_batches, None)) is not None:
+            await chunk_queue.put(chunk_batch)
+        await chunk_queue.put(None)
     
-    print(f"✅ Embeddings generated: {len(chunks_with_embeddings)}")
+    async def embed_stage():
+        batch_number = 0
+        while (chunk_batch := await chunk_queue.get()) is not None:
+            batch_number += 1
+            logger.debug("📦 Batch %d: %d chunks", batch_number, len(chunk_batch))
+            stats['chunks'] += len(chunk_batch)
+            if writer:
+                writer.submit(save_chunks_to_json, chunk_batch, "data/processed_chunks.jsonl", True)
+            
+            records = await generate_embeddings_for_chunks(chunk_batch)
+            stats['embeddings'] += len(records)
+            if persist_intermediate:
+                collected_records.extend(records)
+            await record_queue.put(records)
+        await record_queue.put(None)
     
-    # Save embeddings to JSON file
-    save_embeddings_to_json(chunks_with_embeddings, output_file="data/embeddings_processed.json")
+    async def upload_stage():
+        while (records := await record_queue.get()) is not None:
+            uploaded, failed_batches = await upsert_batches(
+                index, pack_upsert_batches(records), UPSERT_CONCURRENCY, skip_existing
+            )
+            stats['uploaded'] += uploaded
+            stats['failed_batches'] += len(failed_batches)
+            stats['failed_vectors'] += sum(len(batch) for batch in failed_batches)
     
-    # Step 3: Upload to Pinecone
-    print("\n☁️ STEP 3: Uploading to Pinecone...")
+    stages = [asyncio.create_task(stage()) for stage in (chunk_stage, embed_stage, upload_stage)]
+    try:
+        await asyncio.gather(*stages)
+        # Embeddings normally go straight to Pinecone; the saved arrays are only for inspection or re-uploads
+        if writer and collected_records:
+            writer.submit(save_embeddings, collected_records, "data/embeddings_processed")
+    except Exception:
+        # A failed stage would leave the others blocked on their queues
+        for stage in stages:
+            stage.cancel()
+        raise
+    finally:
+        # Drop the files not yet started if a stage failed; the running ones finish quickly
+        chunk_executor.shutdown(wait=True, cancel_futures=True)
+        if writer:
+            # Wait for the pending writes before reporting the run as finished
+            writer.shutdown(wait=True)
     
-    upload_success = upload_to_pinecone(chunks_with_embeddings)
-    if not upload_success:
-        print("❌ Pinecone upload failed. Pipeline stopped.")
+    return stats
+
+
+def run_complete_pipeline(
+    data_folder: str = "data",
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    batch_size: int = 512,
+    persist_intermediate: bool = False,
+    skip_existing: bool = False
+):
+    """
+    Args: data_folder: Folder containing JSON files
+           chunk_size: Size of each chunk in tokens (default: settings.chunk_size, 200 - optimized for context preservation)
+           chunk_overlap: Overlap between chunks in tokens (default: settings.chunk_overlap, 40 - optimal continuity)
+           batch_size: Chunks embedded and uploaded per streamed batch (default: 512)
+           persist_intermediate: Also write data/processed_chunks.jsonl and data/embeddings_processed/ in the background (default: False)
+           skip_existing: Only upload chunk ids not yet in the index, to resume a failed run (default: False)
+    """
+    # Single source of truth for chunking, so every run splits the corpus the same way
+    chunk_size = chunk_size or settings.chunk_size
+    chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.chunk_overlap
+    
+    logger.info("🚀 Starting complete pipeline...")
+    logger.info("=" * 50)
+    logger.info("⚙️  Using optimized parameters: chunk_size=%d, overlap=%d", chunk_size, chunk_overlap)
+    logger.info("   • Chunk size %d tokens: Optimal for maintaining complete context", chunk_size)
+    logger.info("   • Overlap %d tokens: Ensures continuity between chunks", chunk_overlap)
+    logger.info("   • Streaming %d chunks per batch: chunk → embed → upload", batch_size)
+    logger.info("=" * 50)
+    
+    try:
+        stats = asyncio.run(_stream_pipeline(data_folder, chunk_size, chunk_overlap, batch_size, persist_intermediate, skip_existing))
+    except Exception as e:
+        logger.error("❌ Pipeline error: %s", e)
         return False
     
-    print(f"✅ Pinecone upload completed")
+    if not stats['chunks']:
+        logger.error("❌ No chunks generated. Pipeline stopped.")
+        return False
+    if not stats['embeddings']:
+        logger.error("❌ No embeddings generated. Pipeline stopped.")
+        return False
+    
+    if stats['failed_batches']:
+        logger.error(
+            "❌ Pinecone upload failed for %d batches (%d vectors). Pipeline stopped.",
+            stats['failed_batches'], stats['failed_vectors']
+        )
+        logger.error("   • Re-run with --skip-existing to upload only the missing vectors")
+        return False
+    
+    logger.info("✅ Pinecone upload completed")
     
     # Generate comprehensive pipeline summary
-    print("\n" + "=" * 50)
-    print("🎉 PIPELINE COMPLETED SUCCESSFULLY!")
-    print("=" * 50)
-    print(f"📊 Summary:")
-    print(f"   • Chunks created: {len(chunks)}")
-    print(f"   • Embeddings generated: {len(chunks_with_embeddings)}")
-    print(f"   • Vectors uploaded to Pinecone: {len(chunks_with_embeddings)}")
-    print("=" * 50)
+    logger.info("=" * 50)
+    logger.info("🎉 PIPELINE COMPLETED SUCCESSFULLY!")
+    logger.info("=" * 50)
+    logger.info("📊 Summary:")
+    logger.info("   • Chunks created: %d", stats['chunks'])
+    logger.info("   • Embeddings generated: %d", stats['embeddings'])
+    logger.info("   • Vectors uploaded to Pinecone: %d", stats['uploaded'])
+    logger.info("=" * 50)
     
     return True
 # ====================================================================================================== #
@@ -92,13 +200,25 @@ def run_complete_pipeline(data_folder: str = "data", chunk_size: int = 750, chun
 # ====================================================================================================== #
 def main():
 
+    # Console output is plain messages; LOG_LEVEL=WARNING silences the progress lines
+    logging.basicConfig(level=settings.log_level.upper(), format="%(message)s")
+    
+    parser = argparse.ArgumentParser(description="Chunk, embed and upload the knowledge base to Pinecone")
+    parser.add_argument(
+        "--persist-intermediate", "--debug-dump",
+        action="store_true",
+        help="Also write the intermediate chunks and embeddings to data/"
+    )
+    parser.add_argument("--skip-existing", action="store_true", help="Only upload chunks whose ids are not yet in the index")
+    args = parser.parse_args()
+    
     # Execute the complete pipeline with default settings
-    success = run_complete_pipeline(data_folder="data")
+    success = run_complete_pipeline(data_folder="data", persist_intermediate=args.persist_intermediate, skip_existing=args.skip_existing)
     
     if success:
-        print("   • Your knowledge base is now ready in Pinecone")
+        logger.info("   • Your knowledge base is now ready in Pinecone")
     else:
-        print("\n❌ Pipeline failed. Check the logs above for details.")
+        logger.error("❌ Pipeline failed. Check the logs above for details.")
 # ====================================================================================================== #
 
 
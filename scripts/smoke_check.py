@@ -12,9 +12,11 @@ Dependencies:
 """
 
 # ====================================================================================================== #
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from app.core.clients import get_openai_client, get_pinecone_client, get_pinecone_index
 from app.core.settings import settings
-from openai import OpenAI
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import ServerlessSpec
 # ====================================================================================================== #
 
 
@@ -28,8 +30,8 @@ def check_openai_embeddings_and_get_dimension():
         
     Raises: Exception: If OpenAI API call fails
     """
-    # Initialize OpenAI client
-    openai_client = OpenAI(api_key=settings.openai_api_key)
+    # Shared OpenAI client
+    openai_client = get_openai_client()
     
     # Generate test embedding
     embedding_response = openai_client.embeddings.create(
@@ -51,22 +53,24 @@ def check_openai_embeddings_and_get_dimension():
 # ====================================================================================================== #
 # Ensure Pinecone Index Exists
 # ====================================================================================================== #
-def ensure_pinecone_index_exists(vector_dimension: int):
+def ensure_pinecone_index_exists(get_vector_dimension: Callable[[], int]):
     """
-    Args: vector_dimension (int): Dimension of vectors to be stored
+    Args: get_vector_dimension (Callable): Returns the dimension of vectors to be stored; only
+          called (and waited on) when the index has to be created
         
-    Returns: Pinecone.Index: Configured Pinecone index instance
+    Returns: GRPCIndex: Shared handle to the configured Pinecone index
         
     Raises: Exception: If Pinecone operations fail
     """
-    # Initialize Pinecone client
-    pinecone_client = Pinecone(api_key=settings.pinecone_api_key)
+    # Shared Pinecone client
+    pinecone_client = get_pinecone_client()
     
     # Get list of existing indexes
     existing_indexes = {index["name"] for index in pinecone_client.list_indexes().indexes}
     
     # Create index if it doesn't exist
     if settings.pinecone_index not in existing_indexes:
+        vector_dimension = get_vector_dimension()
         print(f"[i] Creating Pinecone index '{settings.pinecone_index}' (dim={vector_dimension})...")
         
         pinecone_client.create_index(
@@ -81,8 +85,8 @@ def ensure_pinecone_index_exists(vector_dimension: int):
     else:
         print(f"[OK] Pinecone index '{settings.pinecone_index}' exists.")
     
-    # Return configured index
-    return pinecone_client.Index(settings.pinecone_index)
+    # Return the shared index handle
+    return get_pinecone_index()
 # ====================================================================================================== #
 
 
@@ -132,11 +136,13 @@ def main():
         3. Vector storage and retrieval
     """
     try:
-        # Test OpenAI embeddings and get vector dimension
-        test_vector, vector_dimension = check_openai_embeddings_and_get_dimension()
-        
-        # Ensure Pinecone index is properly configured
-        pinecone_index = ensure_pinecone_index_exists(vector_dimension)
+        # The OpenAI and Pinecone probes hit different services, so run them side by side;
+        # the index check only waits for the embedding if it has to create the index
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            openai_probe = executor.submit(check_openai_embeddings_and_get_dimension)
+            pinecone_probe = executor.submit(ensure_pinecone_index_exists, lambda: openai_probe.result()[1])
+            test_vector, _ = openai_probe.result()
+            pinecone_index = pinecone_probe.result()
         
         # Test vector storage and retrieval
         test_vector_storage_and_retrieval(pinecone_index, test_vector)
@@ -0,0 +1,13 @@
+"""
+Shared test configuration.
+
+Settings require the API keys at import time, so dummy values are set before any app module
+is imported. No test talks to OpenAI or Pinecone; the clients are replaced where needed.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("PINECONE_API_KEY", "pc-test")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "embedding_cache.sqlite3"))
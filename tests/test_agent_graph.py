@@ -0,0 +1,78 @@
+"""
+Tests for the agent graph helpers (no OpenAI or Pinecone calls).
+"""
+
+import asyncio
+import types
+
+from app.core import embedding_cache
+from app.graph import agent_graph
+
+
+class _FakeEmbeddings:
+    def __init__(self):
+        self.inputs = []
+
+    async def create(self, model, input):
+        self.inputs.append(list(input))
+        return types.SimpleNamespace(data=[
+            types.SimpleNamespace(index=position, embedding=[float(len(text))] * 4)
+            for position, text in enumerate(input)
+        ])
+
+
+def test_question_embeddings_are_cached_in_process_only(monkeypatch):
+    fake_embeddings = _FakeEmbeddings()
+    monkeypatch.setattr(agent_graph, "get_async_openai_client", lambda: types.SimpleNamespace(embeddings=fake_embeddings))
+    monkeypatch.setattr(agent_graph, "_question_embedding_cache", agent_graph.LRUCache(maxsize=2))
+    monkeypatch.setattr(embedding_cache, "put_many", lambda *args: (_ for _ in ()).throw(AssertionError("SQLite write")))
+
+    first = asyncio.run(agent_graph.embed_questions(["hola", "adiós"]))
+    second = asyncio.run(agent_graph.embed_questions(["adiós", "nueva pregunta"]))
+
+    assert first == [[4.0] * 4, [5.0] * 4]
+    assert second == [[5.0] * 4, [14.0] * 4]
+    # Only the unseen question reached the API, and the LRU stays within its bound
+    assert fake_embeddings.inputs == [["hola", "adiós"], ["nueva pregunta"]]
+    assert len(agent_graph._question_embedding_cache) == 2
+
+
+def _match(chunk_id, score):
+    return types.SimpleNamespace(id=chunk_id, score=score, metadata={"text": chunk_id, "sources": "doc.md", "section": "s"})
+
+
+def _patch_pinecone(monkeypatch, matches, rerank):
+    index = types.SimpleNamespace(query=lambda **kwargs: types.SimpleNamespace(matches=matches))
+    client = types.SimpleNamespace(inference=types.SimpleNamespace(rerank=rerank))
+    monkeypatch.setattr(agent_graph, "get_pinecone_index", lambda: index)
+    monkeypatch.setattr(agent_graph, "get_pinecone_client", lambda: client)
+
+
+def test_query_index_keeps_vector_order_when_rerank_fails(monkeypatch):
+    def failing_rerank(**kwargs):
+        raise RuntimeError("rerank unavailable")
+
+    _patch_pinecone(monkeypatch, [_match("a", 0.80), _match("b", 0.78), _match("c", 0.75)], failing_rerank)
+
+    chunks = asyncio.run(agent_graph.query_index("pregunta", [0.0] * 4))
+
+    assert [chunk["chunk_id"] for chunk in chunks] == ["a", "b", "c"]
+    assert [chunk["score"] for chunk in chunks] == [0.80, 0.78, 0.75]
+
+
+def test_query_index_skips_rerank_for_a_single_match(monkeypatch):
+    rerank_calls = []
+    _patch_pinecone(monkeypatch, [_match("a", 0.80)], lambda **kwargs: rerank_calls.append(kwargs))
+
+    chunks = asyncio.run(agent_graph.query_index("pregunta", [0.0] * 4))
+
+    assert [chunk["chunk_id"] for chunk in chunks] == ["a"]
+    assert rerank_calls == []
+
+
+def test_confidence_is_an_exact_decimal():
+    # Top-3 weighted average 0.6*0.62 + 0.3*0.60 + 0.1*0.50 = 0.602 -> (0.602 - 0.20) / 0.50 = 0.804
+    assert agent_graph.compute_confidence_from_scores([0.62, 0.60, 0.50, 0.10]) == 0.804
+    assert agent_graph.compute_confidence_from_scores([0.5, 0.4, 0.3]) == 0.5
+    assert agent_graph.compute_confidence_from_scores([0.95]) == 1.0
+    assert agent_graph.compute_confidence_from_scores([0.15, 0.10]) == 0.0
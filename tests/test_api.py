@@ -0,0 +1,97 @@
+"""
+Tests for the API admission control.
+"""
+
+import asyncio
+
+import httpx
+
+from app.api import main
+
+
+def test_admission_gate_is_all_or_nothing():
+    gate = main.AdmissionGate(limit=4)
+
+    assert gate.try_acquire(3)
+    assert not gate.try_acquire(2)
+    assert gate.in_flight == 3
+    assert gate.try_acquire(1)
+    assert not gate.try_acquire(1)
+
+    gate.release(3)
+    gate.release(1)
+    assert gate.in_flight == 0
+
+
+def test_admission_gate_caps_oversized_requests_at_the_limit():
+    gate = main.AdmissionGate(limit=2)
+
+    assert gate.try_acquire(5)
+    assert gate.in_flight == 2
+    gate.release(5)
+    assert gate.in_flight == 0
+
+
+def test_ask_batch_takes_one_slot_per_question(monkeypatch):
+    monkeypatch.setattr(main, "ask_gate", main.AdmissionGate(limit=4))
+
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def fake_run_agent_batch(questions):
+            started.set()
+            await release.wait()
+            return [{"answer": "ok", "sources": [], "confidence": 0.5} for _ in questions]
+
+        monkeypatch.setattr(main, "run_agent_batch", fake_run_agent_batch)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first_batch = asyncio.create_task(
+                client.post("/ask_batch", json={"questions": ["uno?", "dos?", "tres?"]})
+            )
+            await started.wait()
+            assert main.ask_gate.in_flight == 3
+
+            # 3 of 4 slots are taken, so a 2-question batch does not fit
+            busy_batch = await client.post("/ask_batch", json={"questions": ["cuatro?", "cinco?"]})
+            assert busy_batch.status_code == 503
+            assert busy_batch.headers["retry-after"] == "1"
+            assert main.ask_gate.in_flight == 3
+
+            release.set()
+            assert (await first_batch).status_code == 200
+            assert main.ask_gate.in_flight == 0
+
+            retried_batch = await client.post("/ask_batch", json={"questions": ["cuatro?", "cinco?"]})
+            assert retried_batch.status_code == 200
+            assert len(retried_batch.json()) == 2
+
+    asyncio.run(scenario())
+
+
+def test_ask_is_rejected_while_a_batch_fills_every_slot(monkeypatch):
+    monkeypatch.setattr(main, "ask_gate", main.AdmissionGate(limit=2))
+
+    async def scenario():
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def fake_run_agent_batch(questions):
+            started.set()
+            await release.wait()
+            return [{"answer": "ok", "sources": [], "confidence": 0.5} for _ in questions]
+
+        monkeypatch.setattr(main, "run_agent_batch", fake_run_agent_batch)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            batch = asyncio.create_task(client.post("/ask_batch", json={"questions": ["uno?", "dos?"]}))
+            await started.wait()
+
+            busy_ask = await client.post("/ask", json={"question": "tres?"})
+            assert busy_ask.status_code == 503
+
+            release.set()
+            assert (await batch).status_code == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,164 @@
+"""
+Tests for the Pinecone uploader: batch packing, upsert failure handling and the .npy store
+(no Pinecone calls; the index is a fake returning futures like the gRPC client).
+"""
+
+import asyncio
+import concurrent.futures
+
+import grpc
+import numpy as np
+import pytest
+from pinecone.exceptions import PineconeException
+from tenacity import wait_none
+
+from ingest import pinecone_uploader
+from ingest.embedding_processor import save_embeddings
+from ingest.pinecone_uploader import (
+    UPSERT_MAX_BYTES,
+    UPSERT_MAX_VECTORS,
+    EmbeddingStore,
+    pack_upsert_batches,
+    upsert_batches,
+)
+
+
+def _record(record_id, dimension=4, text="texto"):
+    return {
+        "id": record_id,
+        "values": [0.1] * dimension,
+        "metadata": {"text": text, "sources": "doc.md", "section": "s"},
+    }
+
+
+def test_pack_upsert_batches_caps_vectors_per_request():
+    records = [_record(f"r{i}") for i in range(2500)]
+
+    batches = list(pack_upsert_batches(records))
+
+    assert [len(batch) for batch in batches] == [UPSERT_MAX_VECTORS, UPSERT_MAX_VECTORS, 500]
+
+
+def test_pack_upsert_batches_caps_bytes_per_request():
+    # ~10 KB per record (1536 float32 values plus 4 KB of text): the byte cap binds first
+    records = [_record(f"r{i}", dimension=1536, text="x" * 4000) for i in range(500)]
+    record_bytes = pinecone_uploader._record_size(records[0])
+
+    batches = list(pack_upsert_batches(records))
+
+    per_batch = UPSERT_MAX_BYTES // record_bytes
+    assert [len(batch) for batch in batches] == [per_batch] * (500 // per_batch) + [500 % per_batch]
+    assert all(len(batch) * record_bytes <= UPSERT_MAX_BYTES for batch in batches)
+    assert [record["id"] for batch in batches for record in batch] == [record["id"] for record in records]
+
+
+def test_pack_upsert_batches_with_fixed_size():
+    batches = list(pack_upsert_batches((_record(f"r{i}") for i in range(5)), batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+
+class _UnavailableError(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+
+class _FakeIndex:
+    """
+    Completes upserts like the gRPC index (a future per request). Requests larger than
+    max_vectors, or containing a rejected id, fail with a non-retryable error.
+    """
+
+    def __init__(self, max_vectors=None, rejected_ids=(), unavailable_calls=0):
+        self.max_vectors = max_vectors
+        self.rejected_ids = set(rejected_ids)
+        self.unavailable_calls = unavailable_calls
+        self.requests = []
+
+    def upsert(self, vectors, async_req):
+        ids = [vector.id for vector in vectors]
+        self.requests.append(ids)
+        future = concurrent.futures.Future()
+        if self.unavailable_calls:
+            self.unavailable_calls -= 1
+            try:
+                raise PineconeException("unavailable") from _UnavailableError()
+            except PineconeException as e:
+                future.set_exception(e)
+        elif (self.max_vectors and len(ids) > self.max_vectors) or self.rejected_ids.intersection(ids):
+            future.set_exception(PineconeException("request rejected"))
+        else:
+            future.set_result(None)
+        return future
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(pinecone_uploader._upsert_batch.retry, "wait", wait_none())
+
+
+def test_failed_batches_are_retried_at_half_size():
+    index = _FakeIndex(max_vectors=2)
+    batches = [[_record(f"a{i}") for i in range(4)], [_record("b0")]]
+
+    uploaded, failed = asyncio.run(upsert_batches(index, batches, concurrency=2))
+
+    assert (uploaded, failed) == (5, [])
+    assert sorted(index.requests, key=len)[-1] == ["a0", "a1", "a2", "a3"]
+    assert sorted(request for request in index.requests if len(request) == 2) == [["a0", "a1"], ["a2", "a3"]]
+
+
+def test_batches_failing_again_are_returned_and_not_counted():
+    index = _FakeIndex(rejected_ids={"bad"})
+    batches = [[_record("a"), _record("bad")], [_record("c")]]
+
+    uploaded, failed = asyncio.run(upsert_batches(index, batches, concurrency=2))
+
+    # "c" and, on the half-size retry, "a" were uploaded; only the rejected record is left
+    assert uploaded == 2
+    assert [[record["id"] for record in batch] for batch in failed] == [["bad"]]
+
+
+def test_transient_grpc_errors_are_retried_in_place():
+    index = _FakeIndex(unavailable_calls=2)
+
+    uploaded, failed = asyncio.run(upsert_batches(index, [[_record("a"), _record("b")]], concurrency=1))
+
+    assert (uploaded, failed) == (2, [])
+    assert index.requests == [["a", "b"]] * 3
+
+
+def _embedded_records(count=3, dimension=8):
+    rng = np.random.default_rng(0)
+    return [
+        {"id": f"chunk_{i}", "values": rng.uniform(-0.2, 0.2, dimension).astype(np.float32), "metadata": {"text": f"t{i}"}}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("quantize, tolerance", [("none", 0.0), ("fp16", 1e-3), ("int8", 0.4 / 255)])
+def test_embedding_store_round_trip(tmp_path, quantize, tolerance):
+    records = _embedded_records()
+    save_embeddings(records, str(tmp_path), quantize=quantize)
+
+    store = EmbeddingStore(str(tmp_path))
+    loaded = store[0:len(store)]
+
+    assert len(store) == len(records)
+    assert [record["id"] for record in loaded] == [record["id"] for record in records]
+    assert [record["metadata"] for record in loaded] == [record["metadata"] for record in records]
+    for record, original in zip(loaded, records):
+        assert record["values"].dtype == np.float32
+        np.testing.assert_allclose(record["values"], original["values"], rtol=0, atol=tolerance)
+    assert store[-1]["id"] == "chunk_2"
+
+
+def test_saving_floats_over_an_int8_store_drops_its_quantization_parameters(tmp_path):
+    records = _embedded_records()
+    save_embeddings(records, str(tmp_path), quantize="int8")
+    save_embeddings(records, str(tmp_path), quantize="fp16")
+
+    store = EmbeddingStore(str(tmp_path))
+
+    assert not (tmp_path / "scales.npy").exists()
+    np.testing.assert_allclose(store.rows(0, len(store)), [record["values"] for record in records], rtol=0, atol=1e-3)
@@ -0,0 +1,55 @@
+"""
+Tests for the semantic answer cache.
+"""
+
+from app.core import semantic_cache
+from app.core.semantic_cache import SemanticCache
+
+
+def _response(answer):
+    return {"answer": answer, "sources": ["doc.md"], "confidence": 0.8}
+
+
+def test_lookup_only_reuses_answers_above_the_threshold():
+    cache = SemanticCache(threshold=0.98)
+    cache.store("¿Qué servicios ofrecen?", [1.0, 0.0, 0.0], _response("servicios"))
+
+    # cos = 0.995 and cos = 0.949, on either side of the threshold
+    assert cache.lookup([0.995, 0.0999, 0.0])["answer"] == "servicios"
+    assert cache.lookup([0.949, 0.3153, 0.0]) is None
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(ttl=60)
+    cache.store("pregunta", [1.0, 0.0], _response("respuesta"))
+
+    now[0] += 59
+    assert cache.lookup([1.0, 0.0])["answer"] == "respuesta"
+    now[0] += 1
+    assert cache.lookup([1.0, 0.0]) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(maxsize=2)
+    cache.store("a", [1.0, 0.0, 0.0], _response("a"))
+    cache.store("b", [0.0, 1.0, 0.0], _response("b"))
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.lookup([1.0, 0.0, 0.0])["answer"] == "a"
+    cache.store("c", [0.0, 0.0, 1.0], _response("c"))
+
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0])["answer"] == "a"
+    assert cache.lookup([0.0, 0.0, 1.0])["answer"] == "c"
+
+
+def test_lookup_returns_a_copy_of_the_cached_response():
+    cache = SemanticCache()
+    cache.store("pregunta", [1.0, 0.0], _response("respuesta"))
+
+    cache.lookup([1.0, 0.0])["answer"] = "modificada"
+
+    assert cache.lookup([1.0, 0.0])["answer"] == "respuesta"